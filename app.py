@@ -2,6 +2,7 @@ import streamlit as st
 import os
 import time
 import tempfile
+import uuid
 import speech_recognition as sr
 from gtts import gTTS
 from dotenv import load_dotenv
@@ -17,15 +18,16 @@ if os.path.exists(git_path):
     os.environ["GIT_PYTHON_GIT_EXECUTABLE"] = git_path
 
 # Imports
-from ingestion import ingest_repo
-from db import list_collections
+import jobs
+from db import list_collections, warm_up_embeddings, get_collection_info
 from chat_manager import save_chat_history, load_chat_history
 
 # Module 3 Imports
 from reasoning_core import agent
-from network import measure_latency, get_network_mode
-from native_rag import native_db, manual_chunk_text
-import pdfplumber
+from network import get_monitor, get_network_mode
+from native_rag import native_stores
+from document_pipeline import process_documents
+from tracing import get_tracer, span, trace, STAGES
 
 # Auth Import
 import auth
@@ -39,6 +41,14 @@ st.set_page_config(
     layout="wide"
 )
 
+@st.cache_resource(show_spinner="Loading embedding model...")
+def preload_models():
+    # Runs once per process; later reruns reuse the loaded model
+    warm_up_embeddings()
+    return True
+
+preload_models()
+
 # --- AUDIO HELPERS ---
 def transcribe_audio(audio_bytes):
     r = sr.Recognizer()
@@ -57,7 +67,7 @@ def transcribe_audio(audio_bytes):
 
 def text_to_speech(text):
     try:
-        with tempfile.NamedTemporaryFile(suffix=".mp3", delete=False) as tmp_file:
+        with span("tts", chars=len(text)), tempfile.NamedTemporaryFile(suffix=".mp3", delete=False) as tmp_file:
             tts = gTTS(text=text, lang='en')
             tts.save(tmp_file.name)
             return tmp_file.name
@@ -65,23 +75,68 @@ def text_to_speech(text):
         st.error(f"TTS Error: {e}")
         return None
 
+# --- INGEST JOBS ---
+jobs.start_scheduler()
+
+@st.fragment(run_every=2)
+def ingest_jobs_panel():
+    """Polls background ingest jobs without rerunning the whole app."""
+    recent = jobs.list_jobs(limit=5)
+    if not recent:
+        return
+    st.caption("Ingest jobs")
+    finished = st.session_state.setdefault("finished_jobs", set())
+    newly_done = False
+    for job in recent:
+        counters = job["progress"]
+        label = f"**{job['collection_name']}** · {job['status']}"
+        if job["status"] == "running":
+            label += f" · {job['stage'] or 'starting'}"
+        st.markdown(label)
+        if job["status"] == "running" and counters.get("files_total"):
+            done = counters.get("files", 0) / counters["files_total"]
+            st.progress(min(done, 1.0), text=f"{counters.get('files', 0)}/{counters['files_total']} files, {counters.get('upserted', 0)} chunks stored")
+        if job["status"] in ("queued", "running"):
+            if st.button("Cancel", key=f"cancel_{job['id']}"):
+                jobs.cancel_job(job["id"])
+        elif job["message"]:
+            st.caption(job["message"])
+        if job["status"] == "done" and job["id"] not in finished:
+            finished.add(job["id"])
+            newly_done = True
+            if job["id"] in st.session_state.get("submitted_ingests", set()):
+                # Switch to the repo this session just ingested, with a fresh chat
+                st.session_state.current_collection = job["collection_name"]
+                st.session_state.messages = []
+                save_chat_history(st.session_state.user, job["collection_name"], [])
+    if newly_done:
+        # A finished ingest adds a collection to the sidebar list
+        st.rerun(scope="app")
+
 # --- MAIN APP ---
 
 # Auto-set default user (no login required)
 if "user" not in st.session_state:
     st.session_state.user = "default_user"
+if "session_id" not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex[:12]
 
 st.title("🧠 Adaptive Reasoning Agent")
 user = st.session_state.user
+# Every session is "default_user" until a real login exists, so per-session
+# state (uploaded documents, the LLM fair-queue slot) is keyed on the
+# session, prefixed by the user
+session_owner = f"{user}-{st.session_state.session_id}"
 
 # Sidebar
 with st.sidebar:
     st.header("Status & Context")
     
     # --- Network Sensor ---
+    latency_monitor = get_monitor()
     if st.button("📡 Check Network Latency"):
-        latency = measure_latency()
-        mode = get_network_mode(latency)
+        latency = latency_monitor.probe()
+        mode = get_network_mode(latency_monitor.latency_ms())
         st.session_state.network_mode = mode
         st.session_state.latency = latency
         start_msg = f"Latency: {latency:.0f}ms -> **{mode} MODE**"
@@ -92,7 +147,9 @@ with st.sidebar:
         else:
             st.error(start_msg)
     
-    st.caption(f"Current Mode: **{st.session_state.get('network_mode', 'UNKNOWN')}**")
+    network = latency_monitor.snapshot()
+    p95 = f", p95 {network['p95_ms']:.0f}ms" if network["p95_ms"] is not None else ""
+    st.caption(f"Current Mode: **{network['mode']}** ({network['latency_ms']:.0f}ms avg{p95})")
     st.divider()
 
     # --- History List ---
@@ -129,61 +186,78 @@ with st.sidebar:
 
     # --- Ingest New Repo ---
     with st.expander("Add New Repository", expanded=(st.session_state.get("current_collection") is None)):
-        new_repo_url = st.text_input("GitHub Repo URL", placeholder="https://github.com/owner/repo")
+        new_repo_url = st.text_input("GitHub Repo URL", placeholder="https://github.com/owner/repo, a local folder or a .tar.gz")
+        sparse_input = st.text_input("Only these folders (optional)", placeholder="src, docs")
         mistral_api_key = st.text_input("Mistral API Key", type="password", value=os.getenv("MISTRAL_API_KEY", ""))
         
         if st.button("Ingest New Repo"):
             if not new_repo_url:
                 st.error("Enter a URL")
             else:
-                with st.spinner("Processing & Vectorizing..."):
-                    try:
-                        result = ingest_repo(new_repo_url)
-                        if result.get("status") == "success":
-                            st.success(result["message"])
-                            st.session_state.current_collection = result["collection_name"]
-                            st.session_state.messages = [] 
-                            save_chat_history(user, result["collection_name"], [])
-                            st.rerun()
-                        else:
-                            st.error(result.get("message"))
-                    except Exception as e:
-                        st.error(f"Error: {e}")
+                try:
+                    sparse_paths = [p.strip() for p in sparse_input.split(",") if p.strip()]
+                    job_id = jobs.submit_ingest(new_repo_url, sparse_paths=sparse_paths or None)
+                    st.session_state.setdefault("submitted_ingests", set()).add(job_id)
+                    st.success(f"Queued ingest job {job_id}. You can keep chatting meanwhile.")
+                except Exception as e:
+                    st.error(f"Error: {e}")
+
+    ingest_jobs_panel()
 
     st.divider()
     
      # --- Native RAG ---
     st.subheader("Document Context (Native)")
+    doc_set = st.text_input("Document set", value="default", help="Uploads are stored per session and document set")
     uploaded_files = st.file_uploader("Upload PDF/Text", accept_multiple_files=True)
     if uploaded_files:
         if st.button("Process Documents"):
-            with st.spinner("Chunking..."):
-                all_texts = []
-                for file in uploaded_files:
-                    try:
-                        text = ""
-                        if file.name.endswith(".pdf"):
-                            with pdfplumber.open(file) as pdf:
-                                for page in pdf.pages:
-                                    text += page.extract_text() or ""
-                        else:
-                            text = file.read().decode("utf-8")
-                        
-                        chunks = manual_chunk_text(text)
-                        all_texts.extend(chunks)
-                    except Exception as e:
-                        st.error(f"Error {file.name}: {e}")
-                
-                if all_texts:
-                    native_db.add_texts(all_texts)
-                    st.success(f"Added {len(all_texts)} chunks.")
+            status = st.empty()
+            try:
+                with native_stores.use(session_owner, doc_set) as store:
+                    result = process_documents(
+                        uploaded_files,
+                        store,
+                        progress=lambda c: status.caption(f"{c['pages']} pages, {c['chunks']} chunks, {c['embedded']} embedded"),
+                    )
+                status.empty()
+                for name, error in result["errors"]:
+                    st.error(f"Error {name}: {error}")
+                if result["chunks"]:
+                    st.success(f"Added {result['chunks']} chunks.")
+            except Exception as e:
+                st.error(f"Error: {e}")
+
+    report = native_stores.memory_report()
+    with st.expander(f"Native store memory: {report['total_bytes'] / 2**20:.1f} / {report['budget_bytes'] / 2**20:.0f} MB"):
+        for row in report["namespaces"]:
+            st.caption(f"{row['namespace']}: {row['chunks']} chunks, {row['bytes'] / 2**20:.1f} MB")
+
+    with st.expander("⏱️ Performance"):
+        stage_stats = get_tracer().stage_stats()
+        for stage in STAGES + ("chat",):
+            if stage in stage_stats:
+                row = stage_stats[stage]
+                st.caption(f"{stage}: p50 {row['p50_ms']:.0f}ms · p95 {row['p95_ms']:.0f}ms ({row['count']})")
+        llm_stats = agent.stats()
+        if llm_stats:
+            st.caption(f"LLM: {llm_stats['requests']} calls, hedge rate {llm_stats['hedge_rate']:.0%}, "
+                       f"hedge wins {llm_stats['hedge_win_rate']:.0%}, "
+                       f"{llm_stats['degraded_cache'] + llm_stats['degraded_short_prompt']} degraded")
 
     if "current_collection" in st.session_state and st.session_state.current_collection:
         st.info(f"Active Context: {st.session_state.current_collection}")
+        info = get_collection_info(st.session_state.current_collection)
+        if info:
+            last_ingest = time.strftime("%Y-%m-%d %H:%M", time.localtime(info["last_ingest"])) if info["last_ingest"] else "unknown"
+            st.caption(f"{info['points_count']} chunks | last ingest: {last_ingest}")
         # Renamed Sync Button
         if st.button("🔄 Refresh Context"):
-             st.toast(f"Checking for updates in {st.session_state.current_collection}...")
-             st.success("Context Refreshed (Simulated Git Pull)")
+             try:
+                 job_id = jobs.submit_sync(st.session_state.current_collection)
+                 st.toast(f"Checking for updates in {st.session_state.current_collection} (job {job_id})...")
+             except Exception as e:
+                 st.error(f"Error: {e}")
 
 # --- MAIN CHAT AREA ---
 if "messages" not in st.session_state:
@@ -192,7 +266,9 @@ if "messages" not in st.session_state:
 for message in st.session_state.messages:
     with st.chat_message(message["role"]):
         st.markdown(message["content"])
-        if "latency" in message:
+        if "total_ms" in message:
+             st.caption(f"⏱️ TTFT {message['ttft_ms']:.0f}ms · total {message['total_ms']:.0f}ms | {message['mode']}")
+        elif "latency" in message:
              st.caption(f"⏱️ {message['latency']:.0f}ms | {message['mode']}")
         if "audio" in message:
             st.audio(message["audio"])
@@ -240,17 +316,19 @@ if final_prompt:
         if not os.getenv("MISTRAL_API_KEY"):
              st.error("API Key Missing")
         else:
-            with st.spinner("Thinking..."):
+            with st.spinner("Thinking..."), trace("chat") as turn:
                 try:
-                    repo_context = st.session_state.get("current_collection", "None")
+                    repo_context = st.session_state.get("current_collection") or None
                     
-                    # Streaming response
-                    response_stream_gen, mode, latency = agent.run(final_prompt, context=f"Context: {repo_context}", stream=True)
+                    # Streaming response; the agent retrieves and packs code from the active collection
+                    response_stream_gen, mode, latency = agent.run(final_prompt, stream=True, collection=repo_context, user=session_owner)
                     
                     # Use streamlit's write_stream
                     response_text = st.write_stream(response_stream_gen)
                     
-                    st.caption(f"⏱️ {latency:.0f}ms | {mode}")
+                    ttft_ms = turn.first_token_ms() or 0.0
+                    total_ms = turn.total_ms()
+                    st.caption(f"⏱️ TTFT {ttft_ms:.0f}ms · total {total_ms:.0f}ms | {mode}")
                     
                     # Generate Audio ONLY if toggle is on
                     enable_voice = st.session_state.get("enable_voice_response", False)
@@ -266,7 +344,9 @@ if final_prompt:
                         "role": "assistant", 
                         "content": response_text,
                         "mode": mode,
-                        "latency": latency
+                        "latency": latency,
+                        "ttft_ms": ttft_ms,
+                        "total_ms": total_ms,
                     }
                     if audio_file:
                         msg_data["audio"] = audio_file
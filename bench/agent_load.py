@@ -0,0 +1,79 @@
+"""
+Load test for the shared async chat client (llm_client.LLMClient) against
+the local fake Mistral API.
+
+Many users stream answers at once through one client. For each cap on
+concurrent upstream calls it reports throughput and time to first token;
+with a slow upstream, throughput should grow with the cap. A second run
+has one user flood the queue while others ask one question each, to show
+the fair queue serves the light users first.
+
+Usage:
+    python bench/agent_load.py [--requests 64] [--users 8] [--latency-ms 100] [--tokens-per-s 200]
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_mistral import start_server
+
+async def timed_stream(client, user):
+    start = time.perf_counter()
+    first = None
+    tokens = 0
+    async for _ in client.astream("Explain the ingestion pipeline.", user=user):
+        if first is None:
+            first = time.perf_counter() - start
+        tokens += 1
+    return user, first, time.perf_counter() - start, tokens
+
+async def load(client, requests, users):
+    start = time.perf_counter()
+    results = await asyncio.gather(*(timed_stream(client, f"user{i % users}") for i in range(requests)))
+    return results, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--users", type=int, default=8)
+    parser.add_argument("--latency-ms", type=float, default=100)
+    parser.add_argument("--tokens-per-s", type=float, default=200)
+    parser.add_argument("--answer-tokens", type=int, default=32)
+    args = parser.parse_args()
+
+    server, url = start_server(latency_ms=args.latency_ms, tokens_per_s=args.tokens_per_s,
+                               answer_tokens=args.answer_tokens)
+    os.environ["LATENCY_PROBE_URL"] = url + "/v1/models"
+    from llm_client import LLMClient
+
+    for concurrency in (1, 2, 4, 8, 16):
+        client = LLMClient(api_key="fake", server_url=url, concurrency=concurrency)
+        results, elapsed = asyncio.run(load(client, args.requests, args.users))
+        ttft = np.array([first for _, first, _, _ in results]) * 1000
+        tokens = sum(count for *_, count in results)
+        assert tokens == args.requests * args.answer_tokens
+        print(f"concurrency={concurrency:2d}: {args.requests / elapsed:6.1f} req/s  {tokens / elapsed:7.0f} tokens/s  "
+              f"TTFT p50 {np.percentile(ttft, 50):6.0f}ms p95 {np.percentile(ttft, 95):6.0f}ms  {client.stats()}")
+
+    # Fairness: "heavy" queues 3/4 of the requests before the light users arrive
+    client = LLMClient(api_key="fake", server_url=url, concurrency=2)
+
+    async def mixed():
+        heavy = [asyncio.ensure_future(timed_stream(client, "heavy")) for _ in range(args.requests * 3 // 4)]
+        await asyncio.sleep(0.05)
+        light = [timed_stream(client, f"light{i}") for i in range(args.requests // 4)]
+        return await asyncio.gather(*light), await asyncio.gather(*heavy)
+
+    light, heavy = asyncio.run(mixed())
+    print(f"fair queue (concurrency=2): light users done in p50 {np.median([t for *_, t, _ in light]):.2f}s, "
+          f"heavy user p50 {np.median([t for *_, t, _ in heavy]):.2f}s")
+    print(f"server: {server.stats}")
+    server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Compares the old fixed-size splitter (1000 chars, 200 overlap) with the
+syntax-aware chunker on local repos.
+
+Reports chunk count, total characters that would be embedded and split
+time per repo. With --embed it also times embedding every chunk, which is
+what dominates ingest time.
+
+Usage:
+    python bench/chunking.py <repo-path> [<repo-path> ...] [--embed]
+"""
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import chunker
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+SKIP_DIRS = {"node_modules", "vendor", "dist", "build"}
+
+def load_files(repo_path):
+    files = []
+    for root, dirs, names in os.walk(repo_path):
+        dirs[:] = [d for d in dirs if not d.startswith(".") and d not in SKIP_DIRS]
+        for name in names:
+            path = os.path.join(root, name)
+            if os.path.splitext(name)[1] not in chunker.BRACE_LANGUAGES.keys() | chunker.INDENT_LANGUAGES.keys() | {".py", ".md"}:
+                continue
+            try:
+                with open(path, encoding="utf-8") as f:
+                    files.append((os.path.relpath(path, repo_path), f.read()))
+            except (UnicodeDecodeError, OSError):
+                continue
+    return files
+
+def fixed_split(files):
+    splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
+    return [c for _, text in files for c in splitter.split_text(text)]
+
+def syntax_split(files):
+    return [c for path, text in files for c, _ in chunker.split_text(text, {"file_path": path})]
+
+def measure(name, split_fn, files, model):
+    start = time.perf_counter()
+    chunks = split_fn(files)
+    split_secs = time.perf_counter() - start
+    result = f"  {name:>7}: {len(chunks):6d} chunks  {sum(map(len, chunks)):9d} chars  split {split_secs:6.2f}s"
+    if model is not None:
+        start = time.perf_counter()
+        model.embed_documents(chunks)
+        result += f"  embed {time.perf_counter() - start:7.2f}s"
+    print(result)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("repos", nargs="+")
+    parser.add_argument("--embed", action="store_true", help="Also time embedding every chunk")
+    args = parser.parse_args()
+
+    model = None
+    if args.embed:
+        import model_registry
+        model = model_registry.warm_up(EMBEDDING_MODEL_NAME)
+
+    for repo in args.repos:
+        files = load_files(repo)
+        print(f"{repo}: {len(files)} files, {sum(len(t) for _, t in files)} chars")
+        measure("fixed", fixed_split, files, model)
+        measure("syntax", syntax_split, files, model)
+
+if __name__ == "__main__":
+    main()
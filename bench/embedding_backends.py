@@ -0,0 +1,89 @@
+"""
+Compares embedding backends (torch / int8 / onnx) on a sample repo.
+
+Reports encode throughput per backend and recall@k of each backend's
+nearest neighbours against the first backend listed (torch by default).
+
+Usage:
+    python bench/embedding_backends.py <path-to-local-repo> [--limit 2000] [--k 10]
+"""
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import model_registry
+from chunker import split_text
+
+# Imported by value rather than from db/ingestion so the benchmark doesn't
+# open (and lock) the embedded Qdrant database
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+CODE_EXTENSIONS = {".py", ".js", ".jsx", ".ts", ".tsx", ".java", ".go", ".rs", ".c", ".cpp", ".h", ".md"}
+
+def load_chunks(repo_path, limit):
+    chunks = []
+    for root, dirs, files in os.walk(repo_path):
+        dirs[:] = [d for d in dirs if not d.startswith(".")]
+        for file in files:
+            file_path = os.path.join(root, file)
+            if os.path.splitext(file)[1] not in CODE_EXTENSIONS:
+                continue
+            try:
+                with open(file_path, encoding="utf-8") as f:
+                    text = f.read()
+            except (UnicodeDecodeError, OSError):
+                continue
+            chunks.extend(content for content, _ in split_text(text, {}))
+            if len(chunks) >= limit:
+                return chunks[:limit]
+    return chunks
+
+def top_k(vectors, queries, k):
+    vectors = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    queries = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+    scores = queries @ vectors.T
+    return np.argsort(-scores, axis=1)[:, :k]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("repo_path")
+    parser.add_argument("--limit", type=int, default=2000, help="Max chunks to embed")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--backends", default=",".join(model_registry.BACKENDS))
+    args = parser.parse_args()
+
+    chunks = load_chunks(args.repo_path, args.limit)
+    if not chunks:
+        sys.exit("No supported files found.")
+    # Use the first line of evenly spaced chunks as natural-ish queries
+    step = max(1, len(chunks) // args.queries)
+    queries = [c.strip().splitlines()[0] if c.strip() else c for c in chunks[::step][:args.queries]]
+    print(f"{len(chunks)} chunks, {len(queries)} queries, k={args.k}")
+
+    reference = None
+    for backend in args.backends.split(","):
+        try:
+            model = model_registry.warm_up(EMBEDDING_MODEL_NAME, backend)
+        except Exception as e:
+            print(f"{backend:>6}: unavailable ({e})")
+            continue
+
+        start = time.perf_counter()
+        doc_vecs = np.asarray(model.embed_documents(chunks), dtype=np.float32)
+        elapsed = time.perf_counter() - start
+        query_vecs = np.asarray(model.embed_documents(queries), dtype=np.float32)
+        neighbours = top_k(doc_vecs, query_vecs, args.k)
+
+        if reference is None:
+            reference = neighbours
+        recall = np.mean([
+            len(set(a) & set(b)) / args.k for a, b in zip(neighbours, reference)
+        ])
+        print(f"{backend:>6}: {len(chunks) / elapsed:8.1f} chunks/s  recall@{args.k}={recall:.3f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+"""
+Local stand-in for the Mistral API, for offline benchmarks and load tests.
+
+Serves POST /v1/embeddings with deterministic vectors (seeded by a hash
+of each input, so repeated texts get identical embeddings), POST
+/v1/chat/completions (plain or streamed as server-sent events, generating
+a fixed-length answer at a configurable token rate) and GET /v1/models
+(the latency probe target). Every request can be delayed, a fraction of
+POSTs can be made much slower (tail latency, to exercise hedging) and a
+fraction can fail with 429/500 to exercise retries.
+
+Point the app or a benchmark at it with:
+    MISTRAL_SERVER_URL=http://127.0.0.1:8765 MISTRAL_API_KEY=fake ...
+(the latency monitor follows MISTRAL_SERVER_URL unless LATENCY_PROBE_URL is set)
+
+Usage:
+    python bench/fake_mistral.py [--port 8765] [--latency-ms 50] [--fail-rate 0.0]
+                                 [--tokens-per-s 200] [--answer-tokens 64]
+                                 [--slow-rate 0.0] [--slow-ms 2000]
+"""
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+
+EMBED_DIM = 1024
+ANSWER_TOKENS = 64
+TOKENS_PER_S = 200.0
+
+def fake_embedding(text, dim=EMBED_DIM):
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(dim)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+class FakeMistralHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, like the real API
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        try:
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            self._cancelled()
+
+    def _cancelled(self):
+        # The client gave up on the request (timeout, deadline, hedge loser)
+        with self.server.stats_lock:
+            self.server.stats["cancelled"] += 1
+        self.close_connection = True
+
+    def _send_chunk(self, data):
+        # HTTP/1.1 chunked transfer encoding, so the connection stays reusable
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def _chat(self, request):
+        server = self.server
+        prompt = " ".join(str(message.get("content", "")) for message in request.get("messages") or [])
+        prompt_tokens = len(prompt) // 4 + 1
+        count = min(request.get("max_tokens") or server.answer_tokens, server.answer_tokens)
+        words = [f"token{i} " for i in range(count)]
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": count, "total_tokens": prompt_tokens + count}
+        base = {"id": "fake-chat", "model": request.get("model", "mistral-tiny"), "created": int(time.time())}
+        with server.stats_lock:
+            server.stats["chat"] += 1
+            server.stats["completion_tokens"] += count
+
+        if not request.get("stream"):
+            time.sleep(count / server.tokens_per_s)
+            return self._send(200, dict(base, object="chat.completion", usage=usage, choices=[{
+                "index": 0, "message": {"role": "assistant", "content": "".join(words)}, "finish_reason": "stop",
+            }]))
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            for i, word in enumerate(words):
+                time.sleep(1 / server.tokens_per_s)
+                last = i == count - 1
+                chunk = dict(base, object="chat.completion.chunk", choices=[{
+                    "index": 0, "delta": {"role": "assistant", "content": word},
+                    "finish_reason": "stop" if last else None,
+                }])
+                if last:
+                    chunk["usage"] = usage
+                self._send_chunk(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self._send_chunk(b"data: [DONE]\n\n")
+            self._send_chunk(b"")
+        except (BrokenPipeError, ConnectionResetError):
+            self._cancelled()
+
+    def do_GET(self):
+        with self.server.stats_lock:
+            self.server.stats["requests"] += 1
+        time.sleep(self.server.latency)
+        if self.path.rstrip("/") == "/v1/models":
+            return self._send(200, {"object": "list", "data": [
+                {"id": name, "object": "model"} for name in ("mistral-tiny", "mistral-embed")
+            ]})
+        self._send(404, {"object": "error", "message": f"unknown path {self.path}"})
+
+    def do_POST(self):
+        server = self.server
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        with server.stats_lock:
+            server.stats["requests"] += 1
+        time.sleep(server.latency)
+        if random.random() < server.slow_rate:
+            with server.stats_lock:
+                server.stats["slow"] += 1
+            time.sleep(server.slow)
+        if random.random() < server.fail_rate:
+            with server.stats_lock:
+                server.stats["failures"] += 1
+            status = random.choice((429, 500))
+            return self._send(status, {"object": "error", "message": "injected failure", "code": status})
+
+        if self.path.rstrip("/") == "/v1/chat/completions":
+            return self._chat(request)
+        if self.path.rstrip("/") == "/v1/embeddings":
+            inputs = request.get("input") or []
+            inputs = [inputs] if isinstance(inputs, str) else inputs
+            with server.stats_lock:
+                server.stats["inputs"] += len(inputs)
+            tokens = sum(len(text) // 4 + 1 for text in inputs)
+            return self._send(200, {
+                "id": "fake-embd",
+                "object": "list",
+                "model": request.get("model", "mistral-embed"),
+                "usage": {"prompt_tokens": tokens, "completion_tokens": 0, "total_tokens": tokens},
+                "data": [
+                    {"object": "embedding", "index": i, "embedding": fake_embedding(text, server.dim)}
+                    for i, text in enumerate(inputs)
+                ],
+            })
+        self._send(404, {"object": "error", "message": f"unknown path {self.path}"})
+
+def start_server(port=0, latency_ms=0, fail_rate=0.0, dim=EMBED_DIM, tokens_per_s=TOKENS_PER_S,
+                 answer_tokens=ANSWER_TOKENS, slow_rate=0.0, slow_ms=2000):
+    """Starts the fake API on a background thread. Returns (server, base_url)."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), FakeMistralHandler)
+    server.daemon_threads = True
+    server.latency = latency_ms / 1000
+    server.fail_rate = fail_rate
+    server.dim = dim
+    server.tokens_per_s = tokens_per_s
+    server.answer_tokens = answer_tokens
+    server.slow_rate = slow_rate
+    server.slow = slow_ms / 1000
+    server.stats = {"requests": 0, "failures": 0, "slow": 0, "inputs": 0, "chat": 0, "completion_tokens": 0,
+                    "cancelled": 0}
+    server.stats_lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True, name="fake-mistral").start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    parser.add_argument("--tokens-per-s", type=float, default=TOKENS_PER_S)
+    parser.add_argument("--answer-tokens", type=int, default=ANSWER_TOKENS)
+    parser.add_argument("--slow-rate", type=float, default=0.0)
+    parser.add_argument("--slow-ms", type=float, default=2000)
+    args = parser.parse_args()
+
+    server, url = start_server(args.port, args.latency_ms, args.fail_rate, tokens_per_s=args.tokens_per_s,
+                               answer_tokens=args.answer_tokens, slow_rate=args.slow_rate, slow_ms=args.slow_ms)
+    print(f"Fake Mistral API on {url} (latency {args.latency_ms}ms, fail rate {args.fail_rate}, "
+          f"{args.tokens_per_s:g} tokens/s)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Hedged requests and graceful degradation against the local fake Mistral API.
+
+1. Streams answers one after another from a server where a fraction of
+   requests stall (tail latency), with and without hedging, and compares
+   time-to-first-token percentiles plus hedge rate / win rate.
+2. Runs AdaptiveAgent with a first-token budget shorter than the server's
+   latency, to show the fallback to a cached answer, then to a short prompt
+   (which gets a longer budget of its own).
+
+Usage:
+    python bench/hedging.py [--requests 200] [--latency-ms 40] [--slow-rate 0.05] [--slow-ms 1500]
+"""
+import os
+import sys
+import time
+import tempfile
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_mistral import start_server, fake_embedding
+
+def ttft_run(client, requests, hedge):
+    samples = []
+    for i in range(requests):
+        start = time.perf_counter()
+        tokens = client.stream(f"question {i}", hedge=hedge)
+        next(tokens)
+        samples.append((time.perf_counter() - start) * 1000)
+        for _ in tokens:
+            pass
+    return np.array(samples)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--latency-ms", type=float, default=40)
+    parser.add_argument("--slow-rate", type=float, default=0.05)
+    parser.add_argument("--slow-ms", type=float, default=1500)
+    args = parser.parse_args()
+
+    server, url = start_server(latency_ms=args.latency_ms, slow_rate=args.slow_rate, slow_ms=args.slow_ms,
+                               tokens_per_s=2000, answer_tokens=8)
+    os.environ.update(MISTRAL_SERVER_URL=url, MISTRAL_API_KEY="fake", LATENCY_PROBE_URL=url + "/v1/models",
+                      RESPONSE_CACHE_PATH=os.path.join(tempfile.mkdtemp(), "cache.sqlite"))
+    from llm_client import LLMClient
+
+    print(f"{args.requests} sequential streams, {args.slow_rate:.0%} stall for {args.slow_ms:.0f}ms:")
+    for hedge in (False, True):
+        client = LLMClient(concurrency=4)
+        ttft_run(client, 30, hedge)  # Warm-up: learn the TTFT distribution
+        ttft = ttft_run(client, args.requests, hedge)
+        stats = client.stats()
+        print(f"  hedge={str(hedge):5s} TTFT p50 {np.percentile(ttft, 50):6.0f}ms  p95 {np.percentile(ttft, 95):6.0f}ms  "
+              f"p99 {np.percentile(ttft, 99):6.0f}ms  max {ttft.max():6.0f}ms  "
+              f"hedge rate {stats['hedge_rate']:.1%}  win rate {stats['hedge_win_rate']:.1%}")
+
+    import reasoning_core
+    from response_cache import ResponseCache
+    agent = reasoning_core.AdaptiveAgent()
+    agent.cache = ResponseCache(path=os.environ["RESPONSE_CACHE_PATH"], embed_fn=lambda text: fake_embedding(text, 64))
+    agent.monitor.latency_ms = lambda: 250.0  # Pin STANDARD mode
+    server.slow_rate = 0.0
+    answer, mode, _ = agent.run("What does ingest_repo do?")
+    print(f"\nagent ({mode}): fresh answer, {len(answer)} chars")
+
+    # Every request now stalls past the budget
+    server.latency = 1.0
+    reasoning_core.LLM_BUDGETS[mode] = 0.3
+    reasoning_core.LLM_DEGRADED_BUDGET = 2.0
+    agent.cache.invalidate(None)
+    agent.cache.put("What does ingest_repo do?", "FAST", "cached FAST answer")
+    for question in ("What does ingest_repo do?", "Something never asked"):
+        start = time.perf_counter()
+        answer, mode, _ = agent.run(question)
+        print(f"agent: {question!r} -> {answer[:30]!r} in {time.perf_counter() - start:.2f}s")
+    print(f"agent stats: {agent.stats()}")
+    server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Exercises MistralEmbeddingClient against the local fake Mistral API.
+
+Embeds a synthetic upload (with some duplicated chunks) sequentially and
+with concurrent batches, with injected 429/500 failures, and checks the
+returned vectors against the server's deterministic ones. Then times
+repeated queries through the LRU cache.
+
+Usage:
+    python bench/mistral_embed_client.py [--chunks 2000] [--latency-ms 80] [--fail-rate 0.1] [--concurrency 4]
+"""
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import mistral_embeddings
+from fake_mistral import start_server, fake_embedding
+
+def synthetic_chunks(count, duplicate_every=10):
+    # Every Nth chunk repeats an earlier one, like shared headers/footers
+    return [f"chunk {i % (count // duplicate_every) if i % duplicate_every == 0 else i} " + "lorem ipsum " * 40
+            for i in range(count)]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=2000)
+    parser.add_argument("--latency-ms", type=float, default=80)
+    parser.add_argument("--fail-rate", type=float, default=0.1)
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+
+    server, url = start_server(latency_ms=args.latency_ms, fail_rate=args.fail_rate)
+    mistral_embeddings.BACKOFF_BASE = 0.05  # Keep injected failures from dominating the timing
+    texts = synthetic_chunks(args.chunks)
+    expected = np.array([fake_embedding(t) for t in texts[:50]], dtype=np.float32)
+
+    for concurrency in (1, args.concurrency):
+        client = mistral_embeddings.MistralEmbeddingClient(api_key="fake", server_url=url, concurrency=concurrency)
+        start = time.perf_counter()
+        vectors = client.embed_documents(texts)
+        elapsed = time.perf_counter() - start
+        assert len(vectors) == len(texts)
+        assert np.allclose(vectors[:50], expected, atol=1e-6)
+        print(f"concurrency={concurrency}: {len(texts)} chunks in {elapsed:.2f}s  {client.stats()}")
+
+    queries = [f"question {i % 20}" for i in range(200)]
+    start = time.perf_counter()
+    for query in queries:
+        client.embed_query(query)
+    print(f"{len(queries)} queries ({len(set(queries))} distinct) in {time.perf_counter() - start:.2f}s  {client.stats()}")
+    print(f"server: {server.stats}")
+    server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Recall and latency of the native store's IVF index against exact search.
+
+Vectors are synthetic: a Gaussian mixture, so they have the cluster
+structure real embeddings have (uniform random vectors are a worst case
+no ANN index does well on). No API key is needed.
+
+For each size it trains the index, then reports per-query latency and
+recall@k (fraction of the exact top-k found) for several nprobe values.
+1M rows at 1024 dims (mistral-embed) needs about 4GB of RAM; the default
+dimension is smaller so the full run fits on a laptop.
+
+Usage:
+    python bench/native_ann.py [--rows 10000 100000 1000000] [--dim 256] [--queries 100] [--k 5]
+"""
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from native_rag import NativeVectorStore
+
+NPROBES = (1, 4, 8, 16, 32)
+
+def mixture(rng, centers, rows, noise=0.5):
+    labels = rng.integers(len(centers), size=rows)
+    return centers[labels] + noise * rng.standard_normal((rows, centers.shape[1]), dtype=np.float32)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--clusters", type=int, default=1000, help="Mixture components in the synthetic data")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((args.clusters, args.dim), dtype=np.float32)
+    for rows in args.rows:
+        store = NativeVectorStore(dim=args.dim, initial_capacity=rows, ann="ivf")
+        for offset in range(0, rows, 50000):
+            count = min(50000, rows - offset)
+            store.add_vectors(mixture(rng, centers, count), [""] * count)
+        queries = mixture(rng, centers, args.queries)
+
+        start = time.perf_counter()
+        store._ensure_index()
+        print(f"{rows} rows x {args.dim} dims: {len(store.index.centroids)} lists, trained in {time.perf_counter() - start:.1f}s")
+
+        start = time.perf_counter()
+        exact = [set(store.search_vectors(q, args.k, exact=True)[0][0]) for q in queries]
+        exact_ms = (time.perf_counter() - start) * 1000 / len(queries)
+        print(f"  exact:     {exact_ms:7.2f} ms/query")
+
+        for nprobe in NPROBES:
+            start = time.perf_counter()
+            found = [set(store.search_vectors(q, args.k, nprobe=nprobe)[0][0]) for q in queries]
+            ann_ms = (time.perf_counter() - start) * 1000 / len(queries)
+            recall = sum(len(a & b) for a, b in zip(found, exact)) / (args.k * len(queries))
+            print(f"  nprobe={nprobe:<3} {ann_ms:7.2f} ms/query  recall@{args.k}={recall:.3f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Micro-benchmark for NativeVectorStore search on random vectors.
+
+Compares the old per-document Python loop (cosine + full sort) with the
+matrix-vector product + argpartition top-k, and times batched multi-query
+search. No API key is needed: vectors are random, not embedded.
+
+Usage:
+    python bench/native_search.py [--rows 10000 100000] [--dim 1024] [--queries 100] [--k 5]
+"""
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from native_rag import NativeVectorStore
+
+# The loop baseline is too slow to run on every query at large sizes
+LOOP_MAX_ROWS = 20000
+LOOP_QUERIES = 5
+
+def loop_search(documents, query_vec, k):
+    """The original implementation, kept here only as the baseline."""
+    scores = []
+    for text, doc_vec in documents:
+        norm_q = np.linalg.norm(query_vec)
+        norm_d = np.linalg.norm(doc_vec)
+        score = 0 if norm_q == 0 or norm_d == 0 else np.dot(query_vec, doc_vec) / (norm_q * norm_d)
+        scores.append((score, text))
+    scores.sort(key=lambda x: x[0], reverse=True)
+    return [text for _, text in scores[:k]]
+
+def timed_ms(fn, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - start) * 1000 / repeats
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    queries = rng.standard_normal((args.queries, args.dim), dtype=np.float32)
+
+    for rows in args.rows:
+        store = NativeVectorStore(dim=args.dim)
+        start = time.perf_counter()
+        for offset in range(0, rows, 5000):
+            count = min(5000, rows - offset)
+            store.add_vectors(rng.standard_normal((count, args.dim), dtype=np.float32), [str(offset + i) for i in range(count)])
+        print(f"{rows} rows x {args.dim} dims (insert {time.perf_counter() - start:.2f}s)")
+
+        single = timed_ms(lambda: store.search_vectors(queries[0], args.k), args.queries)
+        batch = timed_ms(lambda: store.search_vectors(queries, args.k), 3) / args.queries
+        print(f"  matrix: {single:8.2f} ms/query  batched: {batch:8.2f} ms/query")
+
+        if rows <= LOOP_MAX_ROWS:
+            documents = list(zip(store.texts, store.vectors[:store.size]))
+            loop = timed_ms(lambda: loop_search(documents, queries[0], args.k), LOOP_QUERIES)
+            # Same winners as the loop, as a sanity check
+            indices, _ = store.search_vectors(queries[0], args.k)
+            assert [store.texts[i] for i in indices[0]] == loop_search(documents, queries[0], args.k)
+            print(f"  loop:   {loop:8.2f} ms/query  ({loop / single:.0f}x slower)")
+
+if __name__ == "__main__":
+    main()
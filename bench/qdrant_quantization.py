@@ -0,0 +1,86 @@
+"""
+Measures search latency and recall loss of int8 scalar quantization.
+
+Copies the vectors of an existing collection into two scratch collections
+(float32, and int8 with rescoring), then runs the same queries against both
+and compares them with an exact (brute force) search. Needs a Qdrant server:
+embedded mode does not implement quantization.
+
+Usage:
+    QDRANT_URL=http://localhost:6333 python bench/qdrant_quantization.py <collection> [--queries 200] [--k 5]
+"""
+import os
+import sys
+import time
+import random
+import argparse
+from qdrant_client import QdrantClient
+from qdrant_client.http.models import (
+    Distance, VectorParams, PointStruct, SearchParams, QuantizationSearchParams,
+    ScalarQuantization, ScalarQuantizationConfig, ScalarType,
+)
+
+def copy_points(client, source, target, quantization_config):
+    client.recreate_collection(
+        collection_name=target,
+        vectors_config=VectorParams(size=384, distance=Distance.COSINE),
+        quantization_config=quantization_config,
+    )
+    vectors = []
+    offset = None
+    while True:
+        points, offset = client.scroll(source, limit=1000, offset=offset, with_vectors=True, with_payload=False)
+        client.upsert(target, points=[PointStruct(id=p.id, vector=p.vector) for p in points], wait=True)
+        vectors.extend(p.vector for p in points)
+        if offset is None:
+            return vectors
+
+def run_queries(client, collection, queries, k, params):
+    results, timings = [], []
+    for query in queries:
+        start = time.perf_counter()
+        hits = client.query_points(collection, query=query, limit=k, search_params=params).points
+        timings.append((time.perf_counter() - start) * 1000)
+        results.append({hit.id for hit in hits})
+    timings.sort()
+    return results, timings[len(timings) // 2], timings[int(len(timings) * 0.95) - 1]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("collection")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--oversampling", type=float, default=2.0)
+    args = parser.parse_args()
+
+    url = os.getenv("QDRANT_URL")
+    if not url:
+        sys.exit("Set QDRANT_URL to a Qdrant server.")
+    client = QdrantClient(url=url, api_key=os.getenv("QDRANT_API_KEY"))
+
+    plain = f"{args.collection}__bench_f32"
+    quantized = f"{args.collection}__bench_int8"
+    vectors = copy_points(client, args.collection, plain, None)
+    copy_points(client, args.collection, quantized, ScalarQuantization(
+        scalar=ScalarQuantizationConfig(type=ScalarType.INT8, quantile=0.99, always_ram=True)
+    ))
+    queries = random.sample(vectors, min(args.queries, len(vectors)))
+    print(f"{len(vectors)} vectors, {len(queries)} queries, k={args.k}")
+
+    try:
+        exact, _, _ = run_queries(client, plain, queries, args.k, SearchParams(exact=True))
+        configs = [
+            ("float32", plain, None),
+            ("int8", quantized, SearchParams(quantization=QuantizationSearchParams(ignore=False, rescore=False))),
+            ("int8+rescore", quantized, SearchParams(quantization=QuantizationSearchParams(rescore=True, oversampling=args.oversampling))),
+        ]
+        for name, collection, params in configs:
+            found, p50, p95 = run_queries(client, collection, queries, args.k, params)
+            recall = sum(len(a & b) for a, b in zip(found, exact)) / (args.k * len(queries))
+            print(f"{name:>13}: recall@{args.k}={recall:.3f}  p50={p50:.2f}ms  p95={p95:.2f}ms")
+    finally:
+        client.delete_collection(plain)
+        client.delete_collection(quantized)
+
+if __name__ == "__main__":
+    main()
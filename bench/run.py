@@ -0,0 +1,260 @@
+"""
+Offline benchmark suite: the main code paths against local stand-ins.
+
+Starts the fake Mistral API (bench/fake_mistral.py) with configurable
+latency and token rate, generates a synthetic repository
+(bench/synthetic_repo.py) and runs each scenario in a throwaway working
+directory, so the Qdrant, manifest, chat and cache stores it creates never
+touch the real ones. No network or API key is needed; ingest and rag use
+the local embedding model, which must already be in the model cache.
+
+Scenarios:
+    ingest  - ingest_repo on the synthetic repo: cold, then an incremental no-op resync
+    rag     - rag.ask_question latency with per-stage timings (runs ingest first if needed)
+    native  - NativeVectorStore add / exact / ANN search scaling
+    agent   - AdaptiveAgent.run per mode: TTFT and total time
+    chat    - chat history save / load for growing histories
+
+Results are written as JSON; --compare prints the relative change of every
+metric against an earlier results file, e.g. from the previous commit.
+
+Usage:
+    python bench/run.py [--scenarios ingest rag native agent chat] [--files 200] [--latency-ms 50]
+                        [--tokens-per-s 200] [--out bench_results.json] [--compare baseline.json]
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import random
+import platform
+import tempfile
+import argparse
+import subprocess
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_DIR)
+
+from fake_mistral import start_server, fake_embedding
+from synthetic_repo import generate_repo
+
+# Pinned probe latency per mode (see network.get_network_mode)
+MODE_LATENCY_MS = {"FAST": 500.0, "STANDARD": 200.0, "DEEP": 50.0}
+NATIVE_DIM = 1024
+NATIVE_QUERIES = 50
+
+def percentiles(samples_ms):
+    samples = np.array(samples_ms, dtype=float)
+    return {"p50_ms": float(np.percentile(samples, 50)), "p95_ms": float(np.percentile(samples, 95)),
+            "mean_ms": float(samples.mean()), "count": len(samples)}
+
+def bench_ingest(args, state):
+    from ingestion import ingest_repo
+    start = time.perf_counter()
+    result = ingest_repo(state["repo"]["root"])
+    cold = time.perf_counter() - start
+    if result.get("status") != "success":
+        raise RuntimeError(result.get("message"))
+    start = time.perf_counter()
+    resync = ingest_repo(state["repo"]["root"], incremental=True)
+    state["collection"] = result["collection_name"]
+    return {
+        "cold_s": cold,
+        "files_per_s": result["files_added"] / cold,
+        "chunks_per_s": result["chunks_added"] / cold,
+        "files": result["files_added"],
+        "chunks": result["chunks_added"],
+        "resync_s": time.perf_counter() - start,
+        "resync_files_changed": resync.get("files_changed", 0),
+    }
+
+def bench_rag(args, state):
+    import rag
+    if "collection" not in state:
+        state["ingest"] = bench_ingest(args, state)
+    identifiers = random.Random(1).sample(state["repo"]["identifiers"], args.questions)
+    samples, stages = [], {}
+    for name in identifiers:
+        start = time.perf_counter()
+        rag.ask_question(state["collection"], f"What does {name} do?", "fake")
+        samples.append((time.perf_counter() - start) * 1000)
+        for stage, secs in rag.get_engine("fake").last_timings.items():
+            stages.setdefault(stage, []).append(secs * 1000)
+    return {"ask": percentiles(samples), "stages": {stage: percentiles(values) for stage, values in stages.items()}}
+
+def bench_native(args, state):
+    from native_rag import NativeVectorStore
+    rng = np.random.default_rng(0)
+    queries = rng.standard_normal((NATIVE_QUERIES, NATIVE_DIM)).astype(np.float32)
+    results = {}
+    for rows in args.native_rows:
+        vectors = rng.standard_normal((rows, NATIVE_DIM)).astype(np.float32)
+        texts = [f"chunk {i}" for i in range(rows)]
+        store = NativeVectorStore(dim=NATIVE_DIM, ann="ivf")
+        start = time.perf_counter()
+        for offset in range(0, rows, 1000):
+            store.add_vectors(vectors[offset:offset + 1000], texts[offset:offset + 1000])
+        add = time.perf_counter() - start
+        exact = []
+        for query in queries:
+            start = time.perf_counter()
+            store.search_vectors(query[None], k=5, exact=True)
+            exact.append((time.perf_counter() - start) * 1000)
+        # First ANN search trains the index (when the store is large enough for one)
+        start = time.perf_counter()
+        store.search_vectors(queries[:1], k=5)
+        first = (time.perf_counter() - start) * 1000
+        ann = []
+        for query in queries:
+            start = time.perf_counter()
+            store.search_vectors(query[None], k=5)
+            ann.append((time.perf_counter() - start) * 1000)
+        results[str(rows)] = {"add_rows_per_s": rows / add, "exact": percentiles(exact),
+                              "first_ann_ms": first, "ann": percentiles(ann),
+                              "memory_mb": store.memory_bytes() / 1e6}
+    return results
+
+def bench_agent(args, state):
+    import tracing
+    import reasoning_core
+    from response_cache import ResponseCache
+    agent = reasoning_core.AdaptiveAgent()
+    # Same cache, without loading the local embedding model for every question
+    agent.cache = ResponseCache(path=os.path.join(state["workdir"], "agent_cache.sqlite"),
+                                embed_fn=lambda text: fake_embedding(text, 64))
+    results = {}
+    for mode, latency_ms in MODE_LATENCY_MS.items():
+        agent.monitor.latency_ms = lambda latency_ms=latency_ms: latency_ms
+        ttft, total = [], []
+        for i in range(args.questions):
+            with tracing.trace("bench") as turn:
+                tokens, _, _ = agent.run(f"{mode} question {i}: how is {state['repo']['identifiers'][i]} used?",
+                                         stream=True)
+                for _ in tokens:
+                    pass
+            if turn.first_token_ms() is not None:
+                ttft.append(turn.first_token_ms())
+            total.append(turn.total_ms())
+        results[mode] = {"ttft": percentiles(ttft) if ttft else None, "total": percentiles(total)}
+    results["llm"] = agent.llm.stats()
+    return results
+
+def bench_chat(args, state):
+    import chat_manager
+    results = {}
+    for count in (10, 100, 1000):
+        messages = [{"role": "user" if i % 2 == 0 else "assistant", "content": f"message {i} " * 40,
+                     "mode": "STANDARD", "ttft_ms": 120, "total_ms": 900} for i in range(count)]
+        save, load = [], []
+        for _ in range(args.chat_repeats):
+            start = time.perf_counter()
+            chat_manager.save_chat_history("bench", "bench/repo", messages)
+            save.append((time.perf_counter() - start) * 1000)
+            start = time.perf_counter()
+            loaded = chat_manager.load_chat_history("bench", "bench/repo")
+            load.append((time.perf_counter() - start) * 1000)
+            assert len(loaded) == count
+        results[str(count)] = {"save": percentiles(save), "load": percentiles(load)}
+    return results
+
+SCENARIOS = {"ingest": bench_ingest, "rag": bench_rag, "native": bench_native, "agent": bench_agent, "chat": bench_chat}
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def flatten(results, prefix=""):
+    """{"a": {"b": 1}} -> {"a.b": 1}, numbers only."""
+    flat = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[prefix + key] = value
+    return flat
+
+def compare(baseline, current):
+    """Prints every metric present in both runs with its relative change."""
+    before, after = flatten(baseline["scenarios"]), flatten(current["scenarios"])
+    print(f"\n{'metric':60s} {baseline['meta'].get('commit') or 'baseline':>12s} "
+          f"{current['meta'].get('commit') or 'current':>12s}   change")
+    for key in sorted(key for key in before.keys() & after.keys() if not key.endswith(".count")):
+        old, new = before[key], after[key]
+        change = f"{(new - old) / old:+.1%}" if old else "n/a"
+        print(f"{key:60s} {old:12.2f} {new:12.2f}   {change}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", nargs="+", default=list(SCENARIOS), choices=list(SCENARIOS))
+    parser.add_argument("--files", type=int, default=200)
+    parser.add_argument("--questions", type=int, default=20)
+    parser.add_argument("--native-rows", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--chat-repeats", type=int, default=20)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--tokens-per-s", type=float, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="bench_results.json")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    parser.add_argument("--keep", action="store_true", help="keep the working directory")
+    args = parser.parse_args()
+    out = os.path.abspath(args.out)
+    baseline_path = os.path.abspath(args.compare) if args.compare else None
+
+    server, url = start_server(latency_ms=args.latency_ms, tokens_per_s=args.tokens_per_s)
+    os.environ.pop("QDRANT_URL", None)
+    os.environ.update(MISTRAL_SERVER_URL=url, MISTRAL_API_KEY="fake", LATENCY_PROBE_URL=url + "/v1/models",
+                      RESPONSE_CACHE_PATH="./response_cache.sqlite")
+    # Modules resolve their stores (./qdrant_db, ./chats, ...) relative to the working directory
+    workdir = tempfile.mkdtemp(prefix="bench-")
+    os.chdir(workdir)
+    state = {"workdir": workdir, "repo": generate_repo(os.path.join(workdir, "synthetic_repo"), args.files,
+                                                       seed=args.seed)}
+    print(f"Synthetic repo: {state['repo']['files']} files, {state['repo']['bytes'] / 1e6:.1f} MB in {workdir}")
+
+    scenarios = {}
+    for name in args.scenarios:
+        print(f"\n== {name}")
+        start = time.perf_counter()
+        try:
+            scenarios[name] = SCENARIOS[name](args, state)
+        except Exception as e:
+            print(f"Scenario {name} failed: {e!r}")
+            scenarios[name] = {"error": repr(e)}
+        scenarios[name]["wall_s"] = time.perf_counter() - start
+        print(json.dumps(scenarios[name], indent=2))
+    if "ingest" in state and "ingest" not in scenarios:
+        scenarios["ingest"] = state["ingest"]
+    server_stats = {key: value for key, value in server.stats.items() if key != "inputs"}
+    server.shutdown()
+
+    results = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "args": {key: value for key, value in vars(args).items() if key not in ("out", "compare")},
+            "repo": {key: value for key, value in state["repo"].items() if key not in ("root", "identifiers")},
+            "server": server_stats,
+        },
+        "scenarios": scenarios,
+    }
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {out}")
+    if baseline_path:
+        with open(baseline_path, encoding="utf-8") as f:
+            compare(json.load(f), results)
+    os.chdir(REPO_DIR)
+    if not args.keep:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
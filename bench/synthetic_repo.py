@@ -0,0 +1,91 @@
+"""
+Generates a synthetic source repository for offline benchmarks.
+
+Files are spread over nested packages in several languages. Sizes follow a
+log-normal distribution (many small files, a long tail of large ones).
+Every file holds real-looking functions and classes with unique
+identifiers, so chunking splits at definitions and identifier lookups have
+exactly one answer. Output is deterministic for a given seed.
+
+Usage:
+    python bench/synthetic_repo.py <output-dir> [--files 200] [--median-kb 3] [--languages py js go md] [--seed 0]
+"""
+import os
+import json
+import random
+import argparse
+
+LANGUAGES = {
+    "py": ("py", "def {name}(items, limit=10):\n    \"\"\"{doc}\"\"\"\n    total = 0\n"
+                 "    for item in items[:limit]:\n        total += len(str(item))\n    return total\n\n",
+           "class {Name}:\n    \"\"\"{doc}\"\"\"\n\n    def __init__(self, size):\n        self.size = size\n\n"
+           "    def run(self):\n        return [{name}(range(self.size))]\n\n"),
+    "js": ("js", "function {name}(items, limit = 10) {{\n  // {doc}\n  let total = 0;\n"
+                 "  for (const item of items.slice(0, limit)) {{\n    total += String(item).length;\n  }}\n  return total;\n}}\n\n",
+           "class {Name} {{\n  // {doc}\n  constructor(size) {{\n    this.size = size;\n  }}\n\n"
+           "  run() {{\n    return [{name}([...Array(this.size).keys()])];\n  }}\n}}\n\n"),
+    "go": ("go", "// {doc}\nfunc {name}(items []string, limit int) int {{\n\ttotal := 0\n"
+                 "\tfor i, item := range items {{\n\t\tif i >= limit {{\n\t\t\tbreak\n\t\t}}\n\t\ttotal += len(item)\n\t}}\n\treturn total\n}}\n\n",
+           "// {doc}\ntype {Name} struct {{\n\tSize int\n}}\n\nfunc (s *{Name}) Run() int {{\n\treturn s.Size\n}}\n\n"),
+    "md": ("md", "## {name}\n\n{doc} It is configured with `{name}_limit` and returns a count.\n\n",
+           "### {Name}\n\n{doc} See also `{name}` for the underlying helper.\n\n"),
+}
+HEADERS = {"py": "import os\n\n", "js": "'use strict';\n\n", "go": "package {package}\n\n", "md": "# {package}\n\n"}
+PACKAGES = ("api", "core", "utils", "services", "models", "handlers", "storage", "jobs")
+TOPICS = ("order", "invoice", "session", "payment", "user", "report", "cache", "token", "webhook", "export")
+VERBS = ("load", "parse", "validate", "render", "sync", "index", "merge", "compute", "flush", "resolve")
+
+def _identifier(rng, counter):
+    return f"{rng.choice(VERBS)}_{rng.choice(TOPICS)}_{counter}"
+
+def generate_repo(root, files=200, median_kb=3.0, languages=("py", "js", "go", "md"), seed=0):
+    """
+    Writes `files` files under `root`. Returns a summary dict including
+    `identifiers` (a sample of defined names, for lookup questions).
+    """
+    rng = random.Random(seed)
+    counter = 0
+    total_bytes = 0
+    per_language = {}
+    identifiers = []
+    for index in range(files):
+        language = languages[index % len(languages)]
+        extension, function_template, class_template = LANGUAGES[language]
+        package = "/".join(rng.sample(PACKAGES, rng.randint(1, 3)))
+        path = os.path.join(root, package, f"{rng.choice(TOPICS)}_{index}.{extension}")
+        target = int(rng.lognormvariate(0, 1) * median_kb * 1024)
+        parts = [HEADERS[language].format(package=package.split("/")[-1])]
+        size = len(parts[0])
+        while size < target:
+            counter += 1
+            name = _identifier(rng, counter)
+            template = class_template if counter % 4 == 0 else function_template
+            doc = f"Handles {name.replace('_', ' ')} for the {package.replace('/', ' ')} layer."
+            block = template.format(name=name, Name=name.title().replace("_", ""), doc=doc)
+            parts.append(block)
+            size += len(block)
+            if len(identifiers) < 500:
+                identifiers.append(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("".join(parts))
+        total_bytes += size
+        per_language[language] = per_language.get(language, 0) + 1
+    return {"root": root, "files": files, "bytes": total_bytes, "languages": per_language,
+            "definitions": counter, "identifiers": identifiers}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("root")
+    parser.add_argument("--files", type=int, default=200)
+    parser.add_argument("--median-kb", type=float, default=3.0)
+    parser.add_argument("--languages", nargs="+", default=list(LANGUAGES), choices=list(LANGUAGES))
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    summary = generate_repo(args.root, args.files, args.median_kb, tuple(args.languages), args.seed)
+    summary.pop("identifiers")
+    print(json.dumps(summary, indent=2))
+
+if __name__ == "__main__":
+    main()
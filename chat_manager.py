@@ -1,5 +1,6 @@
 import os
 import json
+from tracing import span
 
 CHAT_DIR = "./chats"
 
@@ -20,8 +21,9 @@ def save_chat_history(username: str, repo_name: str, messages: list):
     if not username: return
     try:
         filepath = get_chat_file(username, repo_name)
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(messages, f, indent=2, ensure_ascii=False)
+        with span("chat_persistence", op="save", messages=len(messages)):
+            with open(filepath, 'w', encoding='utf-8') as f:
+                json.dump(messages, f, indent=2, ensure_ascii=False)
     except Exception as e:
         print(f"Error saving chat history: {e}")
 
@@ -33,8 +35,9 @@ def load_chat_history(username: str, repo_name: str):
     filepath = get_chat_file(username, repo_name)
     if os.path.exists(filepath):
         try:
-            with open(filepath, 'r', encoding='utf-8') as f:
-                return json.load(f)
+            with span("chat_persistence", op="load"):
+                with open(filepath, 'r', encoding='utf-8') as f:
+                    return json.load(f)
         except Exception as e:
             print(f"Error loading chat history: {e}")
             return []
@@ -0,0 +1,281 @@
+import os
+import re
+import ast
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+# Kept free of db/Qdrant imports: this module is loaded inside the
+# ingestion process pool, and importing db there would try to reopen
+# the embedded Qdrant database.
+
+# Syntax-aware chunks: one per function/class, no overlap
+MAX_CHUNK_CHARS = 1200
+MIN_CHUNK_CHARS = 300  # Smaller neighbouring units are merged up to MAX_CHUNK_CHARS
+
+# Fallback splitter for files we don't parse (HTML, SQL, shell, ...)
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
+
+BRACE_LANGUAGES = {
+    ".js": "javascript", ".jsx": "javascript", ".ts": "typescript", ".tsx": "typescript",
+    ".java": "java", ".c": "c", ".h": "c", ".cpp": "cpp", ".cs": "csharp", ".go": "go",
+    ".rs": "rust", ".php": "php", ".swift": "swift", ".kt": "kotlin", ".scala": "scala",
+    ".css": "css", ".json": "json",
+}
+INDENT_LANGUAGES = {".rb": "ruby", ".yaml": "yaml", ".yml": "yaml", ".toml": "toml"}
+
+SYMBOL_PATTERNS = [
+    re.compile(r"\b(?:class|interface|struct|enum|trait|impl|namespace|module|object|record)\s+([A-Za-z_$][\w$]*)"),
+    re.compile(r"\b(?:function|func|fn|def|fun)\s*\*?\s*(?:\([^)]*\)\s*)?([A-Za-z_$][\w$]*)"),
+    re.compile(r"([A-Za-z_$][\w$]*)\s*(?:[:=]\s*(?:async\s*)?(?:function\b|\([^)]*\)\s*=>)|\()"),
+    re.compile(r"^\s*([^\s{][^{]*?)\s*\{"),  # CSS selectors, JSON keys
+]
+# Lines that belong to the block that follows them
+ATTACHED_LINE = re.compile(r"^\s*(//|/\*|\*|@|#\[|\[)")
+
+_text_splitter = None
+
+def get_text_splitter():
+    global _text_splitter
+    if _text_splitter is None:
+        _text_splitter = RecursiveCharacterTextSplitter(
+            chunk_size=CHUNK_SIZE,
+            chunk_overlap=CHUNK_OVERLAP,
+            add_start_index=True
+        )
+    return _text_splitter
+
+def get_language(path):
+    """Language name used for chunk metadata and search filters."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".py":
+        return "python"
+    if ext == ".md":
+        return "markdown"
+    return BRACE_LANGUAGES.get(ext) or INDENT_LANGUAGES.get(ext) or ext.lstrip(".") or "text"
+
+def _size(lines, start, end):
+    return sum(len(line) for line in lines[start:end])
+
+def _find_symbol(header):
+    for pattern in SYMBOL_PATTERNS:
+        match = pattern.search(header)
+        if match:
+            return match.group(1).strip()[:80]
+    return None
+
+def _python_units(text, lines):
+    """Top-level defs/classes via ast. Oversized classes are split per method."""
+    tree = ast.parse(text)
+
+    def node_units(nodes, start, prefix=""):
+        units = []
+        for node in nodes:
+            end = node.end_lineno
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                # Comments and blank lines above a definition belong to it
+                symbol = prefix + node.name
+                if isinstance(node, ast.ClassDef) and _size(lines, start, end) > MAX_CHUNK_CHARS and node.body:
+                    body_start = min([node.body[0].lineno] + [d.lineno for d in getattr(node.body[0], "decorator_list", [])]) - 1
+                    units.append((start, body_start, symbol))
+                    units.extend(node_units(node.body, body_start, symbol + "."))
+                else:
+                    units.append((start, end, symbol))
+            else:
+                units.append((start, end, None))
+            start = end
+        return units
+
+    units = node_units(tree.body, 0)
+    if not units:
+        # Only comments / blank lines (e.g. a license header in __init__.py)
+        return [(0, len(lines), None)] if lines else []
+    if units[-1][1] < len(lines):
+        units.append((units[-1][1], len(lines), None))
+    return units
+
+def _strip_strings_and_comments(line, in_block_comment):
+    """Removes string literals and comments so braces inside them are ignored."""
+    out = []
+    i = 0
+    quote = None
+    while i < len(line):
+        ch = line[i]
+        if in_block_comment:
+            if line.startswith("*/", i):
+                in_block_comment = False
+                i += 2
+                continue
+        elif quote:
+            if ch == "\\":
+                i += 2
+                continue
+            if ch == quote:
+                quote = None
+        elif line.startswith("//", i):
+            break
+        elif line.startswith("/*", i):
+            in_block_comment = True
+            i += 2
+            continue
+        elif ch in "\"'`":
+            quote = ch
+        else:
+            out.append(ch)
+        i += 1
+    return "".join(out), in_block_comment
+
+def _brace_units(lines):
+    """Top-level `{ ... }` blocks plus the loose lines between them."""
+    units = []
+    depth = 0
+    unit_start = 0
+    block_start = None
+    in_comment = False
+    for i, line in enumerate(lines):
+        code, in_comment = _strip_strings_and_comments(line, in_comment)
+        for ch in code:
+            if ch == "{":
+                if depth == 0 and block_start is None:
+                    # Attach comments/annotations directly above the block
+                    attach = i
+                    while attach > unit_start and lines[attach - 1].strip() and ATTACHED_LINE.match(lines[attach - 1]):
+                        attach -= 1
+                    # Allman style: the signature is on the line before a lone `{`
+                    if code.strip() == "{" and attach > unit_start:
+                        attach -= 1
+                    if attach > unit_start:
+                        units.append((unit_start, attach, None))
+                        unit_start = attach
+                    block_start = i
+                depth += 1
+            elif ch == "}":
+                depth = max(depth - 1, 0)
+        if depth == 0 and block_start is not None:
+            header = "".join(lines[unit_start:block_start + 1])
+            units.append((unit_start, i + 1, _find_symbol(header)))
+            unit_start = i + 1
+            block_start = None
+    if unit_start < len(lines):
+        units.append((unit_start, len(lines), None))
+    return units
+
+def _indent_units(lines, ext):
+    """Units start at every non-blank, unindented line (YAML keys, Ruby defs, TOML tables)."""
+    units = []
+    unit_start = 0
+    symbol = None
+    for i, line in enumerate(lines):
+        stripped = line.strip()
+        if not stripped or line[0].isspace() or stripped.startswith("#"):
+            continue
+        if ext == ".rb" and stripped in ("end", "end."):
+            continue
+        if i > unit_start:
+            units.append((unit_start, i, symbol))
+            unit_start = i
+        symbol = _find_symbol(stripped) if ext == ".rb" else stripped.split(":")[0].strip("[] =")[:80]
+    if unit_start < len(lines):
+        units.append((unit_start, len(lines), symbol))
+    return units
+
+def _markdown_units(lines):
+    units = []
+    unit_start = 0
+    symbol = None
+    for i, line in enumerate(lines):
+        if line.startswith("#"):
+            if i > unit_start:
+                units.append((unit_start, i, symbol))
+                unit_start = i
+            symbol = line.lstrip("#").strip()[:80]
+    if unit_start < len(lines):
+        units.append((unit_start, len(lines), symbol))
+    return units
+
+def _split_oversized(lines, start, end, symbol):
+    """Splits a unit that's too big into line-aligned pieces of at most MAX_CHUNK_CHARS."""
+    pieces = []
+    piece_start = start
+    size = 0
+    for i in range(start, end):
+        line_len = len(lines[i])
+        if size and size + line_len > MAX_CHUNK_CHARS:
+            pieces.append((piece_start, i, symbol))
+            piece_start, size = i, 0
+        size += line_len
+    pieces.append((piece_start, end, symbol))
+    return pieces
+
+def _build_chunks(lines, units, metadata, language):
+    # Split oversized units, then merge small neighbours
+    pieces = []
+    for start, end, symbol in units:
+        if end <= start:
+            continue
+        if _size(lines, start, end) > MAX_CHUNK_CHARS:
+            pieces.extend(_split_oversized(lines, start, end, symbol))
+        else:
+            pieces.append((start, end, symbol))
+
+    merged = []
+    for start, end, symbol in pieces:
+        size = _size(lines, start, end)
+        if merged:
+            m_start, m_end, m_symbols, m_size = merged[-1]
+            if (m_size < MIN_CHUNK_CHARS or size < MIN_CHUNK_CHARS) and m_size + size <= MAX_CHUNK_CHARS:
+                if symbol and symbol not in m_symbols:
+                    m_symbols.append(symbol)
+                merged[-1] = (m_start, end, m_symbols, m_size + size)
+                continue
+        merged.append((start, end, [symbol] if symbol else [], size))
+
+    chunks = []
+    for start, end, symbols, _ in merged:
+        content = "".join(lines[start:end])
+        if not content.strip():
+            continue
+        # Only a single line longer than the cap (minified code) gets here oversized
+        for offset in range(0, len(content), MAX_CHUNK_CHARS):
+            part = content[offset:offset + MAX_CHUNK_CHARS]
+            chunk_meta = dict(metadata)
+            chunk_meta.update({
+                "symbol": ", ".join(symbols) if symbols else "<module>",
+                "start_line": start + 1,
+                "end_line": end,
+                "language": language,
+            })
+            chunks.append((part, chunk_meta))
+    return chunks
+
+def split_text(text: str, metadata: dict):
+    """
+    Splits one file's text into chunks.
+    Code is split on syntax boundaries (one chunk per function/class, with
+    symbol name and line range in the metadata); other files fall back to
+    the character splitter.
+    Returns a list of (page_content, metadata) tuples so results pickle cheaply.
+    """
+    path = metadata.get("file_path") or metadata.get("source") or ""
+    ext = os.path.splitext(path)[1].lower()
+    lines = text.splitlines(keepends=True)
+
+    language = get_language(path)
+    units = None
+    try:
+        if ext == ".py":
+            units = _python_units(text, lines)
+        elif ext in BRACE_LANGUAGES:
+            units = _brace_units(lines)
+        elif ext in INDENT_LANGUAGES:
+            units = _indent_units(lines, ext)
+        elif ext == ".md":
+            units = _markdown_units(lines)
+    except (SyntaxError, ValueError, RecursionError) as e:
+        print(f"Falling back to character splitting for {path}: {e}")
+        units = None
+
+    if units is not None:
+        return _build_chunks(lines, units, metadata, language)
+
+    docs = get_text_splitter().create_documents([text], metadatas=[dict(metadata, language=language)])
+    return [(doc.page_content, doc.metadata) for doc in docs]
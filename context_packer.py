@@ -0,0 +1,110 @@
+import os
+import re
+from mistral_embeddings import estimate_tokens, CHARS_PER_TOKEN
+
+# Context token budget per reasoning mode. FAST keeps prompts small for
+# slow links; DEEP can afford more grounding.
+CONTEXT_BUDGETS = {
+    "FAST": int(os.getenv("CONTEXT_BUDGET_FAST", "800")),
+    "STANDARD": int(os.getenv("CONTEXT_BUDGET_STANDARD", "1500")),
+    "DEEP": int(os.getenv("CONTEXT_BUDGET_DEEP", "3000")),
+    "RAG": int(os.getenv("CONTEXT_BUDGET_RAG", "2000")),
+}
+# Chunks retrieved before packing; the budget decides how many survive
+CONTEXT_CANDIDATES = 8
+# Token-set Jaccard similarity above which a lower-ranked block is dropped
+DUPLICATE_SIMILARITY = 0.8
+
+WORD_PATTERN = re.compile(r"\w+")
+
+class Block:
+    """A contiguous piece of one file, built from one or more retrieved chunks."""
+
+    def __init__(self, doc, score):
+        self.path = doc.metadata.get("file_path") or doc.metadata.get("source") or "unknown"
+        self.start = doc.metadata.get("start_line")
+        self.end = doc.metadata.get("end_line")
+        self.lines = doc.page_content.splitlines(keepends=True)
+        self.score = score
+        # Only chunks whose text is exactly their line range can be merged
+        # (a minified line split into several chunks is not)
+        if self.start is None or self.end is None or len(self.lines) != self.end - self.start + 1:
+            self.start = self.end = None
+
+    def merge(self, other):
+        """Absorbs a block that overlaps or directly follows this one."""
+        if other.end > self.end:
+            self.lines += other.lines[self.end - other.start + 1:]
+            self.end = other.end
+        self.score = max(self.score, other.score)
+
+    @property
+    def text(self):
+        return "".join(self.lines)
+
+    def header(self):
+        return f"[Source: {self.path}:{self.start}-{self.end}]" if self.start else f"[Source: {self.path}]"
+
+def _merge_adjacent(blocks):
+    by_file = {}
+    loose = []
+    for block in blocks:
+        (by_file.setdefault(block.path, []) if block.start else loose).append(block)
+    merged = []
+    for file_blocks in by_file.values():
+        file_blocks.sort(key=lambda b: b.start)
+        current = file_blocks[0]
+        for block in file_blocks[1:]:
+            if block.start <= current.end + 1:
+                current.merge(block)
+            else:
+                merged.append(current)
+                current = block
+        merged.append(current)
+    return merged + loose
+
+def _drop_duplicates(blocks):
+    kept, kept_words = [], []
+    for block in blocks:
+        words = set(WORD_PATTERN.findall(block.text.lower()))
+        if any(len(words & other) / max(1, len(words | other)) >= DUPLICATE_SIMILARITY for other in kept_words):
+            continue
+        kept.append(block)
+        kept_words.append(words)
+    return kept
+
+def pack_context(docs, budget_tokens, scores=None):
+    """
+    Turns ranked documents (best first) into a prompt context of at most
+    `budget_tokens` estimated tokens: merges overlapping / adjacent chunks of
+    the same file, drops near-duplicates, then adds blocks by score until the
+    budget is used. Returns (context, stats).
+    """
+    if scores is None:
+        scores = [1.0 / (rank + 1) for rank in range(len(docs))]
+    blocks = _merge_adjacent([Block(doc, score) for doc, score in zip(docs, scores)])
+    blocks.sort(key=lambda b: b.score, reverse=True)
+    unique = _drop_duplicates(blocks)
+
+    parts, used = [], 0
+    for block in unique:
+        text = f"{block.header()}\n{block.text.strip()}"
+        tokens = estimate_tokens(text)
+        if used + tokens > budget_tokens:
+            if parts:
+                continue  # A smaller lower-ranked block may still fit
+            # Always give the best block, cut to the budget
+            text = text[:max(0, budget_tokens - 1) * CHARS_PER_TOKEN]
+            tokens = estimate_tokens(text)
+        parts.append(text)
+        used += tokens
+
+    stats = {
+        "chunks": len(docs),
+        "blocks": len(parts),
+        "merged": len(docs) - len(blocks),
+        "duplicates": len(blocks) - len(unique),
+        "tokens": used,
+        "budget": budget_tokens,
+    }
+    return "\n\n".join(parts), stats
@@ -1,17 +1,34 @@
 import os
+import time
+import threading
 from langchain_community.vectorstores import Qdrant
-from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_qdrant import QdrantVectorStore
 from qdrant_client import QdrantClient
-from qdrant_client.http.models import Distance, VectorParams
+from qdrant_client.http.models import (
+    Distance, VectorParams, PointStruct, PayloadSchemaType,
+    ScalarQuantization, ScalarQuantizationConfig, ScalarType,
+    SearchParams, QuantizationSearchParams,
+    Filter, FieldCondition, MatchValue, MatchAny,
+)
+import model_registry
+import kv_store
 
 # Initialize Qdrant Client
 qdrant_url = os.getenv("QDRANT_URL")
 qdrant_api_key = os.getenv("QDRANT_API_KEY")
 
 if qdrant_url:
-    # Use Cloud/Server instance
-    client = QdrantClient(url=qdrant_url, api_key=qdrant_api_key)
+    # Use Cloud/Server instance. One shared client per process; its HTTP
+    # connection pool is sized for concurrent ingest upserts and queries.
+    import httpx
+    client = QdrantClient(
+        url=qdrant_url,
+        api_key=qdrant_api_key,
+        limits=httpx.Limits(
+            max_connections=int(os.getenv("QDRANT_MAX_CONNECTIONS", "20")),
+            max_keepalive_connections=int(os.getenv("QDRANT_MAX_KEEPALIVE", "10")),
+        ),
+    )
 else:
     # Use local file storage for persistence (Embedded mode)
     # Use local file storage for persistence (Embedded mode)
@@ -26,38 +43,215 @@ else:
         print("SOLUTION: Please STOP any other running instances of this app (Ctrl+C in terminal) and try again.")
         raise e
 
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+
 def get_embeddings_model():
     """
     Returns the embedding model.
     Using all-MiniLM-L6-v2 for efficiency and zero cost.
+    Wrapped in a disk cache so identical chunks are never embedded twice.
+    The model is loaded once per process by model_registry.
+    """
+    return model_registry.get_embeddings(EMBEDDING_MODEL_NAME)
+
+def warm_up_embeddings():
+    """Preloads the embedding model so the first question doesn't pay for it."""
+    model_registry.warm_up(EMBEDDING_MODEL_NAME)
+
+# Payload fields that get a keyword index so filtered searches stay fast
+PAYLOAD_INDEXES = ["metadata.file_path", "metadata.repo", "metadata.language", "metadata.extension", "metadata.dirs"]
+
+# Set QDRANT_QUANTIZATION=int8 to keep int8 vectors in RAM (4x smaller) and
+# rescore the top candidates with the original float32 vectors
+QDRANT_QUANTIZATION = os.getenv("QDRANT_QUANTIZATION", "").lower()
+QDRANT_OVERSAMPLING = float(os.getenv("QDRANT_OVERSAMPLING", "2.0"))
+
+def create_collection(collection_name: str, quantization: str = None):
+    """Creates a collection with payload indexes and optional int8 quantization."""
+    quantization = QDRANT_QUANTIZATION if quantization is None else quantization
+    quantization_config = None
+    if quantization == "int8":
+        quantization_config = ScalarQuantization(
+            scalar=ScalarQuantizationConfig(type=ScalarType.INT8, quantile=0.99, always_ram=True)
+        )
+    client.create_collection(
+        collection_name=collection_name,
+        vectors_config=VectorParams(size=384, distance=Distance.COSINE),
+        quantization_config=quantization_config,
+    )
+    for field in PAYLOAD_INDEXES:
+        client.create_payload_index(
+            collection_name=collection_name,
+            field_name=field,
+            field_schema=PayloadSchemaType.KEYWORD,
+        )
+
+def get_search_params():
+    """Search params that rescore quantized candidates with the full vectors."""
+    if QDRANT_QUANTIZATION != "int8":
+        return None
+    return SearchParams(
+        quantization=QuantizationSearchParams(rescore=True, oversampling=QDRANT_OVERSAMPLING)
+    )
+
+def build_filter(path: str = None, language: str = None, repo: str = None):
+    """
+    Builds a Qdrant filter from optional search constraints.
+    `path` is a folder ('api' or 'api/v1/') or an exact file path;
+    `language` can be a single name or a list ('python', ['typescript', 'javascript']).
     """
-    return HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
+    conditions = []
+    if path:
+        path = path.strip("/")
+        folder = FieldCondition(key="metadata.dirs", match=MatchValue(value=path))
+        file = FieldCondition(key="metadata.file_path", match=MatchValue(value=path))
+        conditions.append(Filter(should=[folder, file]))
+    if language:
+        languages = [language] if isinstance(language, str) else list(language)
+        conditions.append(FieldCondition(key="metadata.language", match=MatchAny(any=[l.lower() for l in languages])))
+    if repo:
+        conditions.append(FieldCondition(key="metadata.repo", match=MatchValue(value=repo)))
+    return Filter(must=conditions) if conditions else None
+
+# Per-process caches so Streamlit reruns don't hit Qdrant again.
+# Invalidated explicitly by ingest and delete.
+_store_cache = {}
+_info_cache = {}
+_collections_cache = None
+_cache_lock = threading.Lock()
 
 def get_vector_store(collection_name: str):
     """
     Returns the Qdrant vector store for a specific collection.
+    Handles are cached, so the existence check only runs once per collection.
     """
+    vector_store = _store_cache.get(collection_name)
+    if vector_store is not None:
+        return vector_store
+
     embeddings = get_embeddings_model()
-    
-    # Ensure collection exists
-    if not client.collection_exists(collection_name):
-        client.create_collection(
+    with _cache_lock:
+        vector_store = _store_cache.get(collection_name)
+        if vector_store is not None:
+            return vector_store
+
+        # Ensure collection exists
+        if not client.collection_exists(collection_name):
+            create_collection(collection_name)
+            _reset_collections_list()
+
+        vector_store = QdrantVectorStore(
+            client=client,
             collection_name=collection_name,
-            vectors_config=VectorParams(size=384, distance=Distance.COSINE),
+            embedding=embeddings,
         )
-
-    vector_store = QdrantVectorStore(
-        client=client,
-        collection_name=collection_name,
-        embedding=embeddings,
-    )
+        _store_cache[collection_name] = vector_store
     return vector_store
 
+def _reset_collections_list():
+    global _collections_cache
+    _collections_cache = None
+
+def invalidate_collection(collection_name: str = None):
+    """
+    Drops cached handles and metadata for one collection (or all of them).
+    Call after anything that changes a collection outside this module.
+    """
+    with _cache_lock:
+        if collection_name is None:
+            _store_cache.clear()
+            _info_cache.clear()
+        else:
+            _store_cache.pop(collection_name, None)
+            _info_cache.pop(collection_name, None)
+        _reset_collections_list()
+
+def mark_ingested(collection_name: str):
+    """Records the ingest time and refreshes cached metadata for a collection."""
+    kv_store.add_document_metadata(f"collection:{collection_name}", {"last_ingest": time.time()})
+    with _cache_lock:
+        _info_cache.pop(collection_name, None)
+        _reset_collections_list()
+
+def delete_collection(collection_name: str):
+    """Deletes a collection and everything cached about it."""
+    try:
+        client.delete_collection(collection_name)
+    finally:
+        invalidate_collection(collection_name)
+
+def get_collection_info(collection_name: str):
+    """
+    Returns cached {"points_count", "vector_size", "last_ingest"} for a collection,
+    or None if it doesn't exist.
+    """
+    info = _info_cache.get(collection_name)
+    if info is not None:
+        return info
+    try:
+        details = client.get_collection(collection_name)
+    except Exception as e:
+        print(f"Error reading collection {collection_name}: {e}")
+        return None
+    vectors = details.config.params.vectors
+    meta = kv_store.get_document_metadata(f"collection:{collection_name}") or {}
+    info = {
+        "points_count": details.points_count or 0,
+        "vector_size": getattr(vectors, "size", None),
+        "last_ingest": meta.get("last_ingest"),
+    }
+    with _cache_lock:
+        _info_cache[collection_name] = info
+    return info
+
+def upsert_chunks(collection_name: str, ids, vectors, chunks):
+    """
+    Writes pre-embedded chunks straight to Qdrant.
+    Payload layout matches QdrantVectorStore so retrieval works unchanged.
+    `chunks` is a list of (page_content, metadata) tuples.
+    """
+    points = [
+        PointStruct(
+            id=point_id,
+            vector=list(vector),
+            payload={"page_content": content, "metadata": metadata},
+        )
+        for point_id, vector, (content, metadata) in zip(ids, vectors, chunks)
+    ]
+    client.upsert(collection_name=collection_name, points=points, wait=True)
+
+def fetch_documents(collection_name: str, ids):
+    """
+    Loads chunks by point ID, in the order given, without embedding anything.
+    Returns LangChain Documents shaped like QdrantVectorStore search results.
+    """
+    from langchain_core.documents import Document
+    if not ids:
+        return []
+    points = client.retrieve(collection_name=collection_name, ids=list(ids), with_payload=True)
+    by_id = {str(p.id): p for p in points}
+    docs = []
+    for point_id in ids:
+        point = by_id.get(str(point_id))
+        if point is None:
+            continue
+        metadata = dict(point.payload.get("metadata") or {})
+        metadata["_id"] = point.id
+        metadata["_collection_name"] = collection_name
+        docs.append(Document(page_content=point.payload.get("page_content", ""), metadata=metadata))
+    return docs
+
 def list_collections():
     """Returns a list of all available collections (repos)."""
+    global _collections_cache
+    if _collections_cache is not None:
+        return list(_collections_cache)
     try:
         collections_response = client.get_collections()
-        return [c.name for c in collections_response.collections]
+        names = [c.name for c in collections_response.collections]
     except Exception as e:
         print(f"Error listing collections: {e}")
         return []
+    with _cache_lock:
+        _collections_cache = names
+    return list(names)
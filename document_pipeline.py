@@ -0,0 +1,190 @@
+import os
+import re
+import codecs
+import queue
+import tempfile
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import pdfplumber
+from pdfminer.pdftypes import resolve1
+
+# Upload pipeline for the native document store:
+# pages (process pool) -> sentences -> chunks -> embed batches (thread)
+PARSE_WORKERS = int(os.getenv("DOC_PARSE_WORKERS", str(os.cpu_count() or 2)))
+PAGES_PER_TASK = 8
+# Every task re-walks the PDF's page tree when it opens the file, so large
+# documents get bigger ranges: at most this many tasks per worker
+TASKS_PER_WORKER = 4
+DOC_EMBED_BATCH_SIZE = int(os.getenv("DOC_EMBED_BATCH_SIZE", "256"))
+# Embed batches waiting while parsing runs ahead
+EMBED_QUEUE_BATCHES = 4
+TEXT_BLOCK_BYTES = 1 << 16
+
+SENTENCE_BREAK = re.compile(r'(?<=[.!?])\s+')
+
+def iter_sentences(pieces):
+    """
+    Splits a stream of text pieces into the same sentences
+    re.split(SENTENCE_BREAK, "".join(pieces)) would give, holding only the
+    unfinished sentence between pieces.
+    """
+    carry = ""
+    for piece in pieces:
+        if not piece:
+            continue
+        buffer = carry + piece
+        start = 0
+        for match in SENTENCE_BREAK.finditer(buffer):
+            # Whitespace touching the end may continue into the next piece
+            if match.end() == len(buffer):
+                break
+            yield buffer[start:match.start()]
+            start = match.end()
+        carry = buffer[start:]
+    # At the end of the stream trailing whitespace is a final break too
+    yield from SENTENCE_BREAK.split(carry)
+
+def iter_chunks(pieces, chunk_size=500, overlap=50):
+    """
+    Streaming version of native_rag.manual_chunk_text: same chunks, but the
+    text arrives in pieces and each chunk is built from a list of parts
+    instead of repeated string concatenation.
+    """
+    parts, length = [], 0
+    for sentence in iter_sentences(pieces):
+        if length + len(sentence) < chunk_size:
+            parts.append(sentence + " ")
+            length += len(sentence) + 1
+            continue
+        current = "".join(parts)
+        yield current.strip()
+        # Start new chunk with overlap (last N chars of previous)
+        overlap_text = current[-overlap:] if length > overlap else ""
+        parts = [overlap_text, sentence + " "]
+        length = len(overlap_text) + len(sentence) + 1
+    if parts:
+        yield "".join(parts).strip()
+
+def extract_pages(path, start, end):
+    """
+    Process pool task: text of pages [start, end) of the PDF at `path`.
+    The PDF is closed before returning, so no process holds the temp file
+    open (Windows cannot delete an open file).
+    """
+    texts = []
+    # Only this range: pdf.pages would otherwise build a Page object for every page
+    with pdfplumber.open(path, pages=range(start + 1, end + 1)) as pdf:
+        for page in pdf.pages:
+            texts.append(page.extract_text() or "")
+            page.close()  # Drop pdfplumber's per-page object cache
+    return texts
+
+def iter_pdf_pages(path, pool=None):
+    """
+    Yields page texts in order. With a pool, ranges of at least
+    PAGES_PER_TASK pages (at most TASKS_PER_WORKER ranges per worker) are
+    extracted in parallel, with at most 2 * PARSE_WORKERS ranges in flight.
+    """
+    with pdfplumber.open(path, pages=[1]) as pdf:
+        # The page tree's count; len(pdf.pages) would build every page
+        page_count = resolve1(pdf.doc.catalog["Pages"]).get("Count")
+    if not isinstance(page_count, int):
+        with pdfplumber.open(path) as pdf:
+            page_count = len(pdf.pages)
+    if pool is None or page_count <= PAGES_PER_TASK:
+        yield from extract_pages(path, 0, page_count)
+        return
+    per_task = max(PAGES_PER_TASK, -(-page_count // (PARSE_WORKERS * TASKS_PER_WORKER)))
+    in_flight = deque()
+    for start in range(0, page_count, per_task):
+        in_flight.append(pool.submit(extract_pages, path, start, min(start + per_task, page_count)))
+        if len(in_flight) >= PARSE_WORKERS * 2:
+            yield from in_flight.popleft().result()
+    while in_flight:
+        yield from in_flight.popleft().result()
+
+def iter_text_file(file):
+    """Yields decoded blocks of a UTF-8 upload without reading it whole."""
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    for block in iter(lambda: file.read(TEXT_BLOCK_BYTES), b""):
+        yield decoder.decode(block)
+    yield decoder.decode(b"", final=True)
+
+def process_documents(files, store, chunk_size=500, overlap=50, progress=None):
+    """
+    Parses, chunks and embeds uploaded files (file-like objects with a
+    `name`) into `store` (a NativeVectorStore). Chunks are embedded in
+    batches of DOC_EMBED_BATCH_SIZE on a background thread while parsing
+    continues, so memory stays bounded by a few batches and pages.
+    `progress(counters)` is called after each PDF page / text block.
+    Returns counters plus per-file errors.
+    """
+    batches = queue.Queue(maxsize=EMBED_QUEUE_BATCHES)
+    counts = {"files": 0, "pages": 0, "chunks": 0, "embedded": 0}
+    errors = []
+    embed_errors = []
+
+    def embed():
+        while (batch := batches.get()) is not None:
+            if embed_errors:
+                continue  # Drain so the parser never blocks on a dead consumer
+            try:
+                texts, metadatas = zip(*batch)
+                store.add_texts(list(texts), list(metadatas))
+                counts["embedded"] += len(batch)
+            except Exception as e:
+                embed_errors.append(e)
+
+    embedder = threading.Thread(target=embed, daemon=True)
+    embedder.start()
+    batch = []
+    try:
+        with ProcessPoolExecutor(max_workers=PARSE_WORKERS) as pool:
+            for file in files:
+                if embed_errors:
+                    break
+                tmp_path = None
+                try:
+                    is_pdf = file.name.endswith(".pdf")
+                    if is_pdf:
+                        # Workers open the PDF by path instead of receiving its bytes per task
+                        with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as tmp:
+                            tmp.write(file.getbuffer() if hasattr(file, "getbuffer") else file.read())
+                            tmp_path = tmp.name
+                        pieces = iter_pdf_pages(tmp_path, pool)
+                    else:
+                        pieces = iter_text_file(file)
+
+                    def reported(pieces):
+                        for piece in pieces:
+                            counts["pages"] += is_pdf
+                            if progress is not None:
+                                progress(dict(counts))
+                            yield piece
+
+                    for chunk in iter_chunks(reported(pieces), chunk_size, overlap):
+                        if not chunk:
+                            continue
+                        batch.append((chunk, {"source": file.name}))
+                        counts["chunks"] += 1
+                        if len(batch) >= DOC_EMBED_BATCH_SIZE:
+                            batches.put(batch)
+                            batch = []
+                    counts["files"] += 1
+                except Exception as e:
+                    errors.append((file.name, str(e)))
+                finally:
+                    if tmp_path:
+                        try:
+                            os.remove(tmp_path)
+                        except OSError as e:
+                            print(f"Could not remove temp file {tmp_path}: {e}")
+    finally:
+        if batch:
+            batches.put(batch)
+        batches.put(None)
+        embedder.join()
+    if embed_errors:
+        raise embed_errors[0]
+    return dict(counts, errors=errors)
@@ -0,0 +1,241 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+import multiprocessing
+
+# Background ingestion jobs. State lives in SQLite so it survives reruns,
+# closed tabs and app restarts.
+JOBS_DB = os.getenv("INGEST_JOBS_DB", "./jobs.sqlite")
+MAX_CONCURRENT_INGESTS = int(os.getenv("INGEST_MAX_CONCURRENT", "2"))
+# Seconds a cancelled worker process gets to stop on its own before it is killed
+CANCEL_GRACE_SECONDS = 10
+# Progress is written at most this often per job
+PROGRESS_INTERVAL = 0.5
+
+STATUSES = ("queued", "running", "done", "failed", "cancelled")
+
+class JobCancelled(Exception):
+    pass
+
+def _connect():
+    conn = sqlite3.connect(JOBS_DB, timeout=30, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS jobs ("
+        " id TEXT PRIMARY KEY, repo_url TEXT NOT NULL, collection_name TEXT NOT NULL,"
+        " sparse_paths TEXT, incremental INTEGER NOT NULL DEFAULT 0,"
+        " status TEXT NOT NULL, stage TEXT, progress TEXT, message TEXT,"
+        " cancel_requested INTEGER NOT NULL DEFAULT 0,"
+        " created_at REAL NOT NULL, started_at REAL, finished_at REAL)"
+    )
+    conn.commit()
+    return conn
+
+def _update(conn, job_id, **fields):
+    columns = ", ".join(f"{key} = ?" for key in fields)
+    conn.execute(f"UPDATE jobs SET {columns} WHERE id = ?", list(fields.values()) + [job_id])
+    conn.commit()
+
+def _row_to_job(row):
+    job = dict(row)
+    job["sparse_paths"] = json.loads(job["sparse_paths"] or "[]")
+    job["progress"] = json.loads(job["progress"] or "{}")
+    return job
+
+def submit_ingest(repo_url: str, sparse_paths=None, incremental: bool = False):
+    """Queues an ingest and returns its job id. Starts the scheduler if needed."""
+    from ingestion import get_collection_name
+    job_id = uuid.uuid4().hex[:12]
+    conn = _connect()
+    try:
+        conn.execute(
+            "INSERT INTO jobs (id, repo_url, collection_name, sparse_paths, incremental, status, created_at)"
+            " VALUES (?, ?, ?, ?, ?, 'queued', ?)",
+            (job_id, repo_url, get_collection_name(repo_url), json.dumps(sparse_paths or []), int(incremental), time.time()),
+        )
+        conn.commit()
+    finally:
+        conn.close()
+    start_scheduler()
+    return job_id
+
+def submit_sync(collection_name: str):
+    """Queues an incremental re-sync of an already ingested collection."""
+    from ingestion import load_manifest
+    manifest = load_manifest(collection_name)
+    if not manifest or not manifest.get("repo_url"):
+        raise ValueError(f"No ingest manifest found for {collection_name}. Re-ingest the repo first.")
+    return submit_ingest(manifest["repo_url"], manifest.get("sparse_paths"), incremental=True)
+
+def get_job(job_id: str):
+    conn = _connect()
+    try:
+        row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return _row_to_job(row) if row else None
+    finally:
+        conn.close()
+
+def list_jobs(limit: int = 20):
+    """Most recent jobs first."""
+    conn = _connect()
+    try:
+        rows = conn.execute("SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,)).fetchall()
+        return [_row_to_job(row) for row in rows]
+    finally:
+        conn.close()
+
+def cancel_job(job_id: str):
+    """Cancels a queued job immediately; a running one stops at its next progress update."""
+    conn = _connect()
+    try:
+        conn.execute(
+            "UPDATE jobs SET status = 'cancelled', finished_at = ?, message = 'Cancelled before start'"
+            " WHERE id = ? AND status = 'queued'",
+            (time.time(), job_id),
+        )
+        conn.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = 'running'", (job_id,))
+        conn.commit()
+    finally:
+        conn.close()
+
+def run_job(job_id: str):
+    """
+    Runs one ingest job to completion. Used as the worker entry point, in a
+    separate process or in a thread of the app process.
+    """
+    from ingestion import ingest_repo
+    conn = _connect()
+    lock = threading.Lock()
+    last_write = [0.0]
+
+    def progress(stage, counters):
+        # Called from several pipeline threads; throttle writes and poll for cancel
+        now = time.time()
+        with lock:
+            if now - last_write[0] < PROGRESS_INTERVAL and stage != "checkout":
+                return
+            last_write[0] = now
+            row = conn.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row and row["cancel_requested"]:
+                raise JobCancelled()
+            _update(conn, job_id, stage=stage, progress=json.dumps(counters))
+
+    try:
+        job = _row_to_job(conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone())
+        result = ingest_repo(
+            job["repo_url"],
+            incremental=bool(job["incremental"]),
+            sparse_paths=job["sparse_paths"] or None,
+            progress=progress,
+        )
+        status = "done" if result.get("status") == "success" else "failed"
+        _update(conn, job_id, status=status, stage="done", message=result.get("message"), finished_at=time.time())
+    except JobCancelled:
+        _update(conn, job_id, status="cancelled", message="Cancelled", finished_at=time.time())
+    except Exception as e:
+        _update(conn, job_id, status="failed", message=f"Error: {e}", finished_at=time.time())
+    finally:
+        conn.close()
+
+def _use_processes():
+    # The embedded Qdrant database can only be opened by one process, so
+    # workers run as threads unless a Qdrant server is configured
+    return bool(os.getenv("QDRANT_URL"))
+
+class _Scheduler:
+    """Starts queued jobs up to MAX_CONCURRENT_INGESTS and reaps finished ones."""
+
+    def __init__(self):
+        self.workers = {}  # job_id -> (worker, collection_name, cancel_seen_at)
+        self.thread = threading.Thread(target=self._loop, daemon=True, name="ingest-scheduler")
+        self.conn = _connect()
+        # Jobs left "running" by a previous app process are started again
+        self.conn.execute("UPDATE jobs SET status = 'queued', stage = NULL WHERE status = 'running'")
+        self.conn.commit()
+
+    def _loop(self):
+        while True:
+            try:
+                self._reap()
+                self._start_queued()
+            except Exception as e:
+                print(f"Ingest scheduler error: {e}")
+            time.sleep(0.5)
+
+    def _reap(self):
+        from db import invalidate_collection
+        from lexical_index import invalidate_index
+        for job_id, (worker, collection_name, cancel_seen_at) in list(self.workers.items()):
+            if worker.is_alive():
+                if isinstance(worker, multiprocessing.process.BaseProcess):
+                    self._enforce_cancel(job_id, worker, cancel_seen_at)
+                continue
+            del self.workers[job_id]
+            row = self.conn.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row and row["status"] == "running":
+                _update(self.conn, job_id, status="failed", message="Worker exited unexpectedly", finished_at=time.time())
+            # The worker may have been another process; drop this process's caches
+            invalidate_collection(collection_name)
+            if isinstance(worker, multiprocessing.process.BaseProcess):
+                # A thread worker updated the shared cached index in place; closing
+                # it would break queries that are using it right now
+                invalidate_index(collection_name)
+
+    def _enforce_cancel(self, job_id, worker, cancel_seen_at):
+        row = self.conn.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if not row or not row["cancel_requested"]:
+            return
+        if cancel_seen_at is None:
+            self.workers[job_id] = (worker, self.workers[job_id][1], time.time())
+        elif time.time() - cancel_seen_at > CANCEL_GRACE_SECONDS:
+            # Stuck somewhere without progress callbacks (e.g. a long clone)
+            worker.terminate()
+            _update(self.conn, job_id, status="cancelled", message="Cancelled (terminated)", finished_at=time.time())
+
+    def _start_queued(self):
+        free = MAX_CONCURRENT_INGESTS - len(self.workers)
+        if free <= 0:
+            return
+        busy = {collection for _, collection, _ in self.workers.values()}
+        rows = self.conn.execute(
+            "SELECT id, collection_name FROM jobs WHERE status = 'queued' ORDER BY created_at"
+        ).fetchall()
+        for row in rows:
+            if free <= 0:
+                break
+            # Never run two ingests of the same collection at once
+            if row["collection_name"] in busy:
+                continue
+            if _use_processes():
+                # A full rebuild deletes the lexical index file, which fails on
+                # Windows while this process still has it open
+                from lexical_index import invalidate_index
+                invalidate_index(row["collection_name"])
+                worker = multiprocessing.get_context("spawn").Process(target=run_job, args=(row["id"],), daemon=False)
+            else:
+                worker = threading.Thread(target=run_job, args=(row["id"],), daemon=True)
+            # Mark running before starting so the next loop can't start it twice
+            _update(self.conn, row["id"], status="running", started_at=time.time(), stage="starting")
+            worker.start()
+            self.workers[row["id"]] = (worker, row["collection_name"], None)
+            busy.add(row["collection_name"])
+            free -= 1
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+def start_scheduler():
+    """Starts the process-wide job scheduler once."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = _Scheduler()
+            _scheduler.thread.start()
+    return _scheduler
+
+def active_jobs():
+    return [job for job in list_jobs(50) if job["status"] in ("queued", "running")]
@@ -1,9 +1,42 @@
 import json
 import os
+import time
+import threading
+from contextlib import contextmanager
 
 KV_FILE = "rag_metadata.json"
+# Held briefly around every read / read-modify-write; a lock file left
+# behind by a crashed process is broken after this many seconds
+LOCK_STALE_SECONDS = 10
 
-def load_kv():
+_lock = threading.Lock()
+
+@contextmanager
+def _locked():
+    """Serializes access across threads and, via a lock file, across ingest worker processes."""
+    lock_path = KV_FILE + ".lock"
+    with _lock:
+        deadline = time.time() + LOCK_STALE_SECONDS
+        while True:
+            try:
+                fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                break
+            except FileExistsError:
+                if time.time() > deadline:
+                    print(f"Breaking stale lock {lock_path}")
+                    try:
+                        os.remove(lock_path)
+                    except OSError:
+                        pass
+                    deadline = time.time() + LOCK_STALE_SECONDS
+                time.sleep(0.01)
+        try:
+            yield
+        finally:
+            os.close(fd)
+            os.remove(lock_path)
+
+def _read():
     if not os.path.exists(KV_FILE):
         return {}
     try:
@@ -12,14 +45,26 @@ def load_kv():
     except:
         return {}
 
-def save_kv(data):
-    with open(KV_FILE, 'w', encoding='utf-8') as f:
+def _write(data):
+    # Write to a temp file first so a crash never leaves a half-written file
+    tmp_path = f"{KV_FILE}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
         json.dump(data, f, indent=2)
+    os.replace(tmp_path, KV_FILE)
+
+def load_kv():
+    with _locked():
+        return _read()
+
+def save_kv(data):
+    with _locked():
+        _write(data)
 
 def add_document_metadata(doc_id, metadata):
-    db = load_kv()
-    db[doc_id] = metadata
-    save_kv(db)
+    with _locked():
+        db = _read()
+        db[doc_id] = metadata
+        _write(db)
 
 def get_document_metadata(doc_id):
     db = load_kv()
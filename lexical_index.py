@@ -0,0 +1,192 @@
+import os
+import re
+import math
+import sqlite3
+import threading
+from collections import Counter
+
+# One SQLite inverted index per collection, next to the Qdrant data
+LEXICAL_INDEX_DIR = "./lexical_index"
+
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+TOKEN_PATTERN = re.compile(r"[A-Za-z_][A-Za-z0-9_]*|\d+")
+SUBWORD_PATTERN = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+")
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "do", "does", "for", "from", "how",
+    "i", "if", "in", "is", "it", "of", "on", "or", "the", "this", "that", "to", "what",
+    "where", "which", "who", "why", "with", "self", "return", "def", "import",
+}
+
+def tokenize(text, subwords=True):
+    """
+    Splits text into lowercase terms. Identifiers are kept whole and also
+    broken into their snake_case / CamelCase parts, so `NativeVectorStore`
+    matches both 'NativeVectorStore' and 'vector store'.
+    """
+    terms = []
+    for token in TOKEN_PATTERN.findall(text):
+        lower = token.lower()
+        if lower not in STOPWORDS and len(lower) > 1:
+            terms.append(lower)
+        if not subwords:
+            continue
+        parts = SUBWORD_PATTERN.findall(token)
+        if len(parts) > 1:
+            terms.extend(p.lower() for p in parts if len(p) > 1 and p.lower() not in STOPWORDS)
+    return terms
+
+class LexicalIndex:
+    """
+    BM25 inverted index over chunk text, keyed by Qdrant point ID.
+    Only IDs and a few filterable fields are stored; chunk text is fetched
+    from Qdrant by ID when needed.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS docs ("
+            " doc_id INTEGER PRIMARY KEY, point_id TEXT UNIQUE NOT NULL,"
+            " length INTEGER NOT NULL, file_path TEXT, language TEXT);"
+            "CREATE TABLE IF NOT EXISTS postings ("
+            " term TEXT NOT NULL, doc_id INTEGER NOT NULL, tf INTEGER NOT NULL,"
+            " PRIMARY KEY (term, doc_id)) WITHOUT ROWID;"
+            "CREATE INDEX IF NOT EXISTS idx_postings_doc ON postings(doc_id);"
+        )
+        self._conn.commit()
+        self._stats = None
+
+    def _corpus_stats(self):
+        if self._stats is None:
+            count, avg_length = self._conn.execute("SELECT COUNT(*), AVG(length) FROM docs").fetchone()
+            self._stats = (count, avg_length or 0.0)
+        return self._stats
+
+    def add(self, ids, chunks):
+        """Indexes (page_content, metadata) chunks under their point IDs."""
+        with self._lock:
+            # Re-adding an ID replaces it rather than leaving stale postings
+            self._delete(ids)
+            for point_id, (content, metadata) in zip(ids, chunks):
+                terms = Counter(tokenize(content))
+                cursor = self._conn.execute(
+                    "INSERT OR REPLACE INTO docs (point_id, length, file_path, language) VALUES (?, ?, ?, ?)",
+                    (point_id, sum(terms.values()), metadata.get("file_path"), metadata.get("language")),
+                )
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO postings (term, doc_id, tf) VALUES (?, ?, ?)",
+                    [(term, cursor.lastrowid, tf) for term, tf in terms.items()],
+                )
+            self._conn.commit()
+            self._stats = None
+
+    def delete(self, ids):
+        with self._lock:
+            self._delete(ids)
+            self._conn.commit()
+            self._stats = None
+
+    def _delete(self, ids):
+        for i in range(0, len(ids), 500):
+            part = ids[i:i + 500]
+            placeholders = ",".join("?" * len(part))
+            doc_ids = [row[0] for row in self._conn.execute(
+                f"SELECT doc_id FROM docs WHERE point_id IN ({placeholders})", part
+            )]
+            if not doc_ids:
+                continue
+            doc_placeholders = ",".join("?" * len(doc_ids))
+            self._conn.execute(f"DELETE FROM postings WHERE doc_id IN ({doc_placeholders})", doc_ids)
+            self._conn.execute(f"DELETE FROM docs WHERE doc_id IN ({doc_placeholders})", doc_ids)
+
+    def search(self, query, k=5, path=None, language=None, exact=False):
+        """
+        Returns [(point_id, bm25_score)] best first.
+        `path` / `language` mirror db.build_filter. With exact=True only whole
+        identifiers are matched, not their snake_case / CamelCase parts.
+        """
+        terms = set(tokenize(query, subwords=not exact))
+        if not terms:
+            return []
+
+        where, params = "", []
+        if path:
+            path = path.strip("/")
+            # "_" and "%" in folder names are literal, not LIKE wildcards
+            escaped = path.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            where += " AND (d.file_path = ? OR d.file_path LIKE ? ESCAPE '\\')"
+            params += [path, escaped + "/%"]
+        if language:
+            languages = [language] if isinstance(language, str) else list(language)
+            where += f" AND d.language IN ({','.join('?' * len(languages))})"
+            params += [l.lower() for l in languages]
+
+        with self._lock:
+            count, avg_length = self._corpus_stats()
+            if not count:
+                return []
+            scores = {}
+            for term in terms:
+                df = self._conn.execute("SELECT COUNT(*) FROM postings WHERE term = ?", (term,)).fetchone()[0]
+                if not df:
+                    continue
+                idf = math.log(1 + (count - df + 0.5) / (df + 0.5))
+                rows = self._conn.execute(
+                    "SELECT d.point_id, p.tf, d.length FROM postings p JOIN docs d ON d.doc_id = p.doc_id"
+                    f" WHERE p.term = ?{where}",
+                    [term] + params,
+                )
+                for point_id, tf, length in rows:
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * length / avg_length)
+                    scores[point_id] = scores.get(point_id, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+def get_index_file(collection_name: str):
+    if not os.path.exists(LEXICAL_INDEX_DIR):
+        os.makedirs(LEXICAL_INDEX_DIR)
+    return os.path.join(LEXICAL_INDEX_DIR, f"{collection_name}.sqlite")
+
+def get_index(collection_name: str):
+    """Returns the process-wide lexical index for a collection, creating it if needed."""
+    with _indexes_lock:
+        index = _indexes.get(collection_name)
+        if index is None:
+            index = LexicalIndex(get_index_file(collection_name))
+            _indexes[collection_name] = index
+        return index
+
+def invalidate_index(collection_name: str):
+    """
+    Closes this process's cached handle (and corpus stats) for a collection,
+    so the next get_index() reopens the file. Call after another process
+    may have rebuilt or deleted it.
+    """
+    with _indexes_lock:
+        index = _indexes.pop(collection_name, None)
+    if index is not None:
+        index.close()
+
+def drop_index(collection_name: str):
+    """Deletes a collection's lexical index (used before a full rebuild)."""
+    with _indexes_lock:
+        index = _indexes.pop(collection_name, None)
+        if index is not None:
+            index.close()
+        path = get_index_file(collection_name)
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
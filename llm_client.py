@@ -0,0 +1,353 @@
+import os
+import time
+import queue
+import asyncio
+import threading
+from collections import OrderedDict, deque
+import httpx
+from mistralai import Mistral
+from mistral_embeddings import estimate_tokens, MISTRAL_SERVER_URL
+from network import get_monitor
+
+LLM_MODEL = "mistral-tiny"
+# Upstream chat calls in flight across all users; the rest wait in a fair queue
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+# Seconds until the full answer (complete) or the first token (stream)
+LLM_REQUEST_TIMEOUT = float(os.getenv("LLM_REQUEST_TIMEOUT", "60"))
+LLM_CONNECT_TIMEOUT = 5.0
+# Longest silence allowed between two streamed chunks
+LLM_READ_TIMEOUT = 30.0
+# Streams with no first token after this percentile of recent TTFTs get a
+# duplicate (hedge) request; whichever answers first wins, the other is cancelled
+HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "90"))
+HEDGE_MIN_SAMPLES = 20  # No hedging until the percentile means something
+HEDGE_MIN_DELAY = 0.05
+TTFT_WINDOW = 200
+
+_DONE = object()
+
+class FairLimiter:
+    """
+    Concurrency cap with round-robin queueing across users: when a slot
+    frees up it goes to the next user in turn, not to whoever queued the
+    most requests. Requests of one user are served in FIFO order.
+    Must be used from a single event loop.
+    """
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.active = 0
+        self.max_waiting = 0
+        self._queues = OrderedDict()  # user -> deque of waiter futures
+
+    def waiting(self):
+        return sum(len(waiters) for waiters in self._queues.values())
+
+    async def acquire(self, user=None):
+        if self.active < self.limit and not self._queues:
+            self.active += 1
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(user, deque()).append(waiter)
+        self.max_waiting = max(self.max_waiting, self.waiting())
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release()  # The slot was handed over just as we were cancelled
+            else:
+                waiters = self._queues.get(user)
+                if waiters is not None and waiter in waiters:
+                    waiters.remove(waiter)
+                    if not waiters:
+                        del self._queues[user]
+            raise
+
+    def release(self):
+        # The slot passes straight to the next waiter, so `active` is unchanged
+        while self._queues:
+            user, waiters = next(iter(self._queues.items()))
+            waiter = waiters.popleft()
+            if waiters:
+                self._queues.move_to_end(user)
+            else:
+                del self._queues[user]
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+class LLMClient:
+    """
+    Shared async chat client for every session in the process.
+
+    One Mistral SDK instance with one pooled httpx.AsyncClient runs on a
+    private event loop thread. At most `concurrency` upstream calls are in
+    flight; the rest queue fairly per user (FairLimiter). Each call has a
+    timeout. Streams that are slow to produce a first token are hedged with
+    a duplicate request (see HEDGE_PERCENTILE). The async methods can be
+    awaited from any event loop, the sync ones from any thread (e.g.
+    Streamlit script threads).
+    """
+
+    def __init__(self, api_key=None, server_url=MISTRAL_SERVER_URL, model=LLM_MODEL,
+                 concurrency=LLM_MAX_CONCURRENCY, timeout=LLM_REQUEST_TIMEOUT):
+        self.api_key = api_key or os.getenv("MISTRAL_API_KEY")
+        self.server_url = server_url
+        self.model = model
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.monitor = get_monitor()
+        self.requests = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self._ttft = deque(maxlen=TTFT_WINDOW)  # Seconds, of winning attempts
+        self._client = None
+        self._limiter = None
+        self._loop = None
+        self._loop_lock = threading.Lock()
+
+    def _ensure_loop(self):
+        with self._loop_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, daemon=True, name="llm-client").start()
+        return self._loop
+
+    def _submit(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self._ensure_loop())
+
+    def _get_client(self):
+        # Built on the private loop, which owns the connection pool
+        if self._client is None:
+            # Hedges bypass the limiter (at most one per stream), so the pool has
+            # room for them even when every limiter slot is busy
+            pool = httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=2 * self.concurrency, max_keepalive_connections=self.concurrency),
+                timeout=httpx.Timeout(LLM_READ_TIMEOUT, connect=LLM_CONNECT_TIMEOUT),
+            )
+            self._client = Mistral(api_key=self.api_key, server_url=self.server_url, async_client=pool)
+            self._limiter = FairLimiter(self.concurrency)
+        return self._client
+
+    def _log_prompt_tokens(self, prompt, usage):
+        actual = getattr(usage, "prompt_tokens", None)
+        print(f"Prompt tokens: ~{estimate_tokens(prompt)} estimated" + (f", {actual} billed" if actual is not None else ""))
+
+    async def _acquire(self, user, deadline):
+        """Waits for a limiter slot until `deadline` (perf_counter); queueing counts against the budget."""
+        try:
+            await asyncio.wait_for(self._limiter.acquire(user), max(0, deadline - time.perf_counter()))
+        except asyncio.TimeoutError as e:
+            self._record_failure(e)
+            raise asyncio.TimeoutError("budget spent waiting for a free slot") from e
+
+    async def _complete(self, prompt, user, timeout, max_tokens):
+        deadline = time.perf_counter() + (timeout or self.timeout)
+        client = self._get_client()
+        await self._acquire(user, deadline)
+        start = time.perf_counter()
+        try:
+            self.requests += 1
+            response = await asyncio.wait_for(
+                client.chat.complete_async(model=self.model, messages=[{"role": "user", "content": prompt}],
+                                           max_tokens=max_tokens),
+                max(0, deadline - start),
+            )
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self._record_failure(e)
+            raise
+        finally:
+            self._limiter.release()
+        # Real calls double as latency samples for the monitor
+        self.monitor.observe_request((time.perf_counter() - start) * 1000)
+        self._log_prompt_tokens(prompt, response.usage)
+        return response.choices[0].message.content
+
+    def hedge_delay(self):
+        """Seconds without a first token before a stream is hedged, or None while still learning."""
+        if len(self._ttft) < HEDGE_MIN_SAMPLES:
+            return None
+        samples = sorted(self._ttft)
+        return max(HEDGE_MIN_DELAY, samples[min(len(samples) - 1, int(HEDGE_PERCENTILE / 100 * len(samples)))])
+
+    async def _open_stream(self, client, prompt, max_tokens):
+        """One attempt: opens a stream and waits for its first chunk. Returns (response, chunks, first)."""
+        response = await client.chat.stream_async(model=self.model, messages=[{"role": "user", "content": prompt}],
+                                                  max_tokens=max_tokens)
+        chunks = response.__aiter__()
+        try:
+            first = await chunks.__anext__()
+        except StopAsyncIteration:
+            first = None
+        except BaseException:
+            await response.response.aclose()
+            raise
+        return response, chunks, first
+
+    async def _first_chunk(self, client, prompt, max_tokens, budget, hedge):
+        """
+        Races a primary attempt and, once the learned hedge delay passes, a
+        hedge attempt for the first chunk. Raises asyncio.TimeoutError when
+        neither produces one within `budget` seconds. The returned TTFT is
+        measured from the primary's start, whichever attempt won.
+        """
+        start = time.perf_counter()
+        primary = asyncio.ensure_future(self._open_stream(client, prompt, max_tokens))
+        attempts = [primary]
+        delay = self.hedge_delay() if hedge else None
+        error = None
+        try:
+            while attempts:
+                now = time.perf_counter() - start
+                wait = budget - now
+                if wait <= 0:
+                    raise asyncio.TimeoutError(f"no first token within the remaining {budget:.1f}s budget")
+                can_hedge = delay is not None and attempts == [primary]
+                if can_hedge:
+                    wait = min(wait, delay - now)
+                done, _ = await asyncio.wait(attempts, timeout=max(0, wait), return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    attempts.remove(task)
+                    if task.exception() is None:
+                        if task is not primary:
+                            self.hedge_wins += 1
+                        # From the primary's start: a hedge's own TTFT would leave out the
+                        # delay before it was sent and bias the learned distribution low
+                        return (*task.result(), time.perf_counter() - start)
+                    error = task.exception()
+                if not done and can_hedge and self._limiter.waiting() == 0:
+                    # Hedges skip the fair queue, so only send one while nobody is waiting
+                    self.hedges += 1
+                    attempts.append(asyncio.ensure_future(self._open_stream(client, prompt, max_tokens)))
+                elif not done and can_hedge:
+                    delay = None
+            raise error
+        finally:
+            for task in attempts:
+                if task.done() and not task.cancelled() and task.exception() is None:
+                    await task.result()[0].response.aclose()  # Lost a tie
+                else:
+                    task.cancel()
+
+    async def _stream(self, prompt, user, timeout, max_tokens, hedge, emit):
+        """
+        Runs one streamed completion on the private loop, passing tokens to
+        `emit`. Every exit except cancellation emits either the exception or
+        _DONE, so the consumer never waits forever.
+        """
+        try:
+            await self._stream_tokens(prompt, user, timeout, max_tokens, hedge, emit)
+        except asyncio.CancelledError:
+            raise  # The consumer went away
+        except Exception as e:
+            emit(e)
+            return
+        emit(_DONE)
+
+    async def _stream_tokens(self, prompt, user, timeout, max_tokens, hedge, emit):
+        # The budget bounds queueing plus the first token; later gaps are bounded by LLM_READ_TIMEOUT
+        deadline = time.perf_counter() + (timeout or self.timeout)
+        client = self._get_client()
+        await self._acquire(user, deadline)
+        usage = None
+        try:
+            self.requests += 1
+            response, chunks, chunk, ttft = await self._first_chunk(client, prompt, max_tokens,
+                                                                    deadline - time.perf_counter(), hedge)
+            self._ttft.append(ttft)
+            self.monitor.observe_request(ttft * 1000)
+            async with response:
+                while chunk is not None:
+                    # Usage arrives on the final chunk
+                    usage = chunk.data.usage or usage
+                    if chunk.data.choices and chunk.data.choices[0].delta.content:
+                        emit(chunk.data.choices[0].delta.content)
+                    try:
+                        chunk = await chunks.__anext__()
+                    except StopAsyncIteration:
+                        chunk = None
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self._record_failure(e)
+            raise
+        finally:
+            self._limiter.release()
+        self._log_prompt_tokens(prompt, usage)
+
+    def _record_failure(self, error):
+        self.failures += 1
+        if isinstance(error, asyncio.TimeoutError):
+            # Waiting on the model, not the network: don't push the mode to FAST
+            self.timeouts += 1
+            return
+        self.monitor.observe_failure()
+
+    async def acomplete(self, prompt, user=None, timeout=None, max_tokens=None):
+        """Returns the full answer. `timeout` (seconds) overrides LLM_REQUEST_TIMEOUT."""
+        return await asyncio.wrap_future(self._submit(self._complete(prompt, user, timeout, max_tokens)))
+
+    async def astream(self, prompt, user=None, timeout=None, max_tokens=None, hedge=True):
+        """
+        Async generator of answer tokens. `timeout` is the budget in seconds
+        for the first token (asyncio.TimeoutError when exceeded). Closing the
+        generator early cancels the upstream call.
+        """
+        loop = asyncio.get_running_loop()
+        tokens = asyncio.Queue()
+        future = self._submit(self._stream(prompt, user, timeout, max_tokens, hedge,
+                                           lambda item: loop.call_soon_threadsafe(tokens.put_nowait, item)))
+        try:
+            while (item := await tokens.get()) is not _DONE:
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            future.cancel()
+
+    def complete(self, prompt, user=None, timeout=None, max_tokens=None):
+        return self._submit(self._complete(prompt, user, timeout, max_tokens)).result()
+
+    def stream(self, prompt, user=None, timeout=None, max_tokens=None, hedge=True):
+        """Sync astream(); the request runs on the client's loop."""
+        tokens = queue.Queue()
+        future = self._submit(self._stream(prompt, user, timeout, max_tokens, hedge, tokens.put))
+        try:
+            while (item := tokens.get()) is not _DONE:
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            future.cancel()
+
+    def stats(self):
+        limiter = self._limiter
+        return {
+            "requests": self.requests,
+            "failures": self.failures,
+            "timeouts": self.timeouts,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "hedge_rate": self.hedges / self.requests if self.requests else 0.0,
+            "hedge_win_rate": self.hedge_wins / self.hedges if self.hedges else 0.0,
+            "hedge_delay_ms": delay * 1000 if (delay := self.hedge_delay()) is not None else None,
+            "active": limiter.active if limiter else 0,
+            "waiting": limiter.waiting() if limiter else 0,
+            "max_waiting": limiter.max_waiting if limiter else 0,
+        }
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_llm_client():
+    """Process-wide chat client shared by all sessions."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = LLMClient()
+    return _client
@@ -0,0 +1,153 @@
+import os
+import time
+import random
+import asyncio
+import threading
+from collections import OrderedDict
+import httpx
+import numpy as np
+from mistralai import Mistral
+
+# Request shaping for mistral-embed. Token counts are estimated from
+# characters, which is conservative for prose and code alike.
+EMBED_MODEL = "mistral-embed"
+MAX_BATCH_ITEMS = int(os.getenv("MISTRAL_EMBED_BATCH_ITEMS", "128"))
+MAX_BATCH_TOKENS = int(os.getenv("MISTRAL_EMBED_BATCH_TOKENS", "16000"))
+CHARS_PER_TOKEN = 3
+MAX_CONCURRENCY = int(os.getenv("MISTRAL_EMBED_CONCURRENCY", "4"))
+MAX_RETRIES = int(os.getenv("MISTRAL_EMBED_RETRIES", "5"))
+BACKOFF_BASE = 0.5  # Seconds; doubles per attempt, with jitter
+BACKOFF_MAX = 30.0
+REQUEST_TIMEOUT_MS = 60000
+QUERY_CACHE_SIZE = 1024
+# Point at a local fake server (bench/fake_mistral.py) for offline testing
+MISTRAL_SERVER_URL = os.getenv("MISTRAL_SERVER_URL") or None
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN + 1
+
+def make_batches(texts, max_items=MAX_BATCH_ITEMS, max_tokens=MAX_BATCH_TOKENS):
+    """
+    Groups texts into consecutive batches under both limits. A text larger
+    than max_tokens on its own still gets a batch, so the API reports it.
+    """
+    batches, current, current_tokens = [], [], 0
+    for text in texts:
+        tokens = estimate_tokens(text)
+        if current and (len(current) >= max_items or current_tokens + tokens > max_tokens):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(text)
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+def _is_retryable(error):
+    status = getattr(error, "status_code", None)
+    if status is not None:
+        return status == 429 or status >= 500
+    return isinstance(error, (httpx.TransportError, asyncio.TimeoutError))
+
+class MistralEmbeddingClient:
+    """
+    mistral-embed client for bulk and query embedding.
+
+    Documents are de-duplicated, split into size/token-bounded batches and
+    sent with at most `concurrency` requests in flight. Rate limits (429),
+    server errors and network errors are retried with exponential backoff.
+    Query embeddings go through a small LRU cache.
+
+    All requests run on one private event loop thread, so the sync methods
+    are safe to call from Streamlit script threads.
+    """
+
+    def __init__(self, api_key=None, server_url=MISTRAL_SERVER_URL, model=EMBED_MODEL,
+                 concurrency=MAX_CONCURRENCY, max_retries=MAX_RETRIES, query_cache_size=QUERY_CACHE_SIZE):
+        self.api_key = api_key or os.getenv("MISTRAL_API_KEY")
+        self.model = model
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.query_cache_size = query_cache_size
+        self.client = Mistral(api_key=self.api_key, server_url=server_url, timeout_ms=REQUEST_TIMEOUT_MS) if self.api_key else None
+        self.requests = 0
+        self.retries = 0
+        self.cache_hits = 0
+        self._query_cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._loop = None
+        self._loop_lock = threading.Lock()
+
+    def _run(self, coro):
+        with self._loop_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, daemon=True, name="mistral-embed").start()
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    async def _embed_batch(self, batch, semaphore):
+        async with semaphore:
+            for attempt in range(self.max_retries + 1):
+                try:
+                    self.requests += 1
+                    response = await self.client.embeddings.create_async(model=self.model, inputs=batch)
+                    # Results carry their input index; don't rely on response order
+                    vectors = [None] * len(batch)
+                    for item in response.data:
+                        vectors[item.index] = item.embedding
+                    return vectors
+                except Exception as e:
+                    if attempt == self.max_retries or not _is_retryable(e):
+                        raise
+                    self.retries += 1
+                    delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt) * (0.5 + random.random() / 2)
+                    reason = f"status {e.status_code}" if hasattr(e, "status_code") else repr(e)
+                    print(f"mistral-embed batch of {len(batch)} failed ({reason}); retrying in {delay:.1f}s")
+                    await asyncio.sleep(delay)
+
+    async def aembed_documents(self, texts):
+        """Returns a float32 matrix with one row per input text."""
+        if not self.client:
+            raise ValueError("Mistral API Key not set")
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        # Identical chunks (headers, boilerplate) are embedded once
+        unique = list(dict.fromkeys(texts))
+        batches = make_batches(unique)
+        semaphore = asyncio.Semaphore(self.concurrency)
+        start = time.perf_counter()
+        results = await asyncio.gather(*(self._embed_batch(batch, semaphore) for batch in batches))
+        vectors = {}
+        for batch, batch_vectors in zip(batches, results):
+            vectors.update(zip(batch, batch_vectors))
+        if len(batches) > 1:
+            print(f"Embedded {len(unique)} unique of {len(texts)} chunks in {len(batches)} batches "
+                  f"({time.perf_counter() - start:.2f}s)")
+        return np.array([vectors[text] for text in texts], dtype=np.float32)
+
+    def embed_documents(self, texts):
+        return self._run(self.aembed_documents(texts))
+
+    def embed_queries(self, queries):
+        """Like embed_documents, but served from the LRU cache where possible."""
+        with self._cache_lock:
+            cached = {q: self._query_cache[q] for q in queries if q in self._query_cache}
+            for q in cached:
+                self._query_cache.move_to_end(q)
+            self.cache_hits += len(cached)
+        missing = [q for q in dict.fromkeys(queries) if q not in cached]
+        if missing:
+            fresh = self.embed_documents(missing)
+            with self._cache_lock:
+                for q, vector in zip(missing, fresh):
+                    cached[q] = vector
+                    self._query_cache[q] = vector
+                while len(self._query_cache) > self.query_cache_size:
+                    self._query_cache.popitem(last=False)
+        return np.array([cached[q] for q in queries], dtype=np.float32)
+
+    def embed_query(self, query):
+        return self.embed_queries([query])[0]
+
+    def stats(self):
+        return {"requests": self.requests, "retries": self.retries, "query_cache_hits": self.cache_hits}
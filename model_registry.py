@@ -0,0 +1,87 @@
+import os
+import threading
+from langchain_huggingface import HuggingFaceEmbeddings
+from embedding_cache import CachedEmbeddings
+
+# Embedding backend settings
+#   torch - stock sentence-transformers model (default)
+#   int8  - torch dynamic int8 quantization of the Linear layers
+#   onnx  - sentence-transformers ONNX Runtime backend
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "32"))
+EMBEDDING_THREADS = int(os.getenv("EMBEDDING_THREADS", "0"))  # 0 = library default
+
+BACKENDS = ("torch", "int8", "onnx")
+
+_models = {}
+_cached = {}
+_lock = threading.Lock()
+
+def _configure_threads():
+    if EMBEDDING_THREADS <= 0:
+        return
+    # ONNX Runtime and MKL read these when the model is created
+    os.environ.setdefault("OMP_NUM_THREADS", str(EMBEDDING_THREADS))
+    import torch
+    torch.set_num_threads(EMBEDDING_THREADS)
+
+def _load_model(model_name, backend):
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown embedding backend '{backend}'. Choose one of {BACKENDS}.")
+    _configure_threads()
+
+    model_kwargs = {"device": "cpu"}
+    if backend == "onnx":
+        model_kwargs["backend"] = "onnx"
+
+    model = HuggingFaceEmbeddings(
+        model_name=model_name,
+        model_kwargs=model_kwargs,
+        encode_kwargs={"batch_size": EMBEDDING_BATCH_SIZE},
+    )
+
+    if backend == "int8":
+        import torch
+        # Quantize the underlying SentenceTransformer in place
+        model._client = torch.quantization.quantize_dynamic(
+            model._client, {torch.nn.Linear}, dtype=torch.qint8
+        )
+    return model
+
+def get_raw_model(model_name, backend=None):
+    """
+    Returns the process-wide embedding model for (model_name, backend),
+    loading it on first use. Does not go through the embedding cache.
+    """
+    backend = backend or EMBEDDING_BACKEND
+    key = (model_name, backend)
+    model = _models.get(key)
+    if model is None:
+        with _lock:
+            model = _models.get(key)
+            if model is None:
+                print(f"Loading embedding model {model_name} ({backend} backend)...")
+                model = _load_model(model_name, backend)
+                _models[key] = model
+    return model
+
+def get_embeddings(model_name, backend=None):
+    """Returns the shared, disk-cached embeddings wrapper for a model."""
+    backend = backend or EMBEDDING_BACKEND
+    key = (model_name, backend)
+    embeddings = _cached.get(key)
+    if embeddings is None:
+        model = get_raw_model(model_name, backend)
+        # Backends produce slightly different vectors, so they get separate cache keys
+        cache_name = model_name if backend == "torch" else f"{model_name}:{backend}"
+        with _lock:
+            if key not in _cached:
+                _cached[key] = CachedEmbeddings(model, cache_name)
+            embeddings = _cached[key]
+    return embeddings
+
+def warm_up(model_name, backend=None):
+    """Loads the model and runs one encode so the first real request is fast."""
+    model = get_raw_model(model_name, backend)
+    model.embed_query("warm up")
+    return model
@@ -1,93 +1,512 @@
+import io
 import os
 import re
-import numpy as np
 import json
-from mistralai import Mistral
+import time
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+import numpy as np
 from dotenv import load_dotenv
+from mistral_embeddings import MistralEmbeddingClient
+from document_pipeline import iter_chunks
 
 load_dotenv()
 
-# Initialize Mistral Client for Embeddings
-api_key = os.getenv("MISTRAL_API_KEY")
-client = Mistral(api_key=api_key) if api_key else None
+# Batched, retrying mistral-embed client shared by all native stores
+embedder = MistralEmbeddingClient()
+
+# Uploaded documents are embedded once and kept here across restarts,
+# one directory per user / document set
+NATIVE_STORE_DIR = os.getenv("NATIVE_STORE_DIR", "./native_store")
+# Loaded stores beyond this are unloaded least recently used first
+NATIVE_MEMORY_BUDGET_MB = int(os.getenv("NATIVE_MEMORY_BUDGET_MB", "512"))
+# Rough per-chunk overhead of the Python str and metadata dict
+CHUNK_OVERHEAD_BYTES = 300
+
+# Optional approximate search: NATIVE_ANN=ivf switches stores above
+# NATIVE_ANN_MIN_ROWS rows from a full scan to an IVF-flat index
+NATIVE_ANN = os.getenv("NATIVE_ANN", "").lower()
+NATIVE_ANN_MIN_ROWS = int(os.getenv("NATIVE_ANN_MIN_ROWS", "20000"))
+IVF_NPROBE = int(os.getenv("NATIVE_IVF_NPROBE", "8"))
+KMEANS_ITERATIONS = 10
+# k-means trains on a sample of at most this many rows per list
+KMEANS_SAMPLE_PER_LIST = 40
+# Assignment and training work on blocks of rows to bound temporary memory
+ASSIGN_BLOCK = 16384
+# Appended row batches an inverted list holds before add() merges them
+LIST_MAX_PARTS = 8
 
 def manual_chunk_text(text, chunk_size=500, overlap=50):
     """
     Splits text into chunks of approximately `chunk_size` characters,
     respecting sentence boundaries where possible.
     """
-    # Split by simple sentence-ending punctuation
-    sentences = re.split(r'(?<=[.!?])\s+', text)
-    chunks = []
-    current_chunk = ""
-    
-    for sentence in sentences:
-        if len(current_chunk) + len(sentence) < chunk_size:
-            current_chunk += sentence + " "
-        else:
-            chunks.append(current_chunk.strip())
-            # Start new chunk with overlap (last N chars of previous)
-            overlap_text = current_chunk[-overlap:] if len(current_chunk) > overlap else ""
-            current_chunk = overlap_text + sentence + " "
-    
-    if current_chunk:
-        chunks.append(current_chunk.strip())
-    
-    return chunks
+    return list(iter_chunks([text], chunk_size, overlap))
+
+def _top_k(scores, k):
+    """Indices of the k highest scores per row, best first."""
+    if k < scores.shape[-1]:
+        # Partial selection is O(n); only the k winners get sorted
+        top = np.argpartition(-scores, k - 1, axis=-1)[..., :k]
+    else:
+        top = np.broadcast_to(np.arange(scores.shape[-1]), scores.shape[:-1] + (scores.shape[-1],))
+    order = np.argsort(-np.take_along_axis(scores, top, axis=-1), axis=-1)
+    return np.take_along_axis(top, order, axis=-1)
+
+class IVFIndex:
+    """
+    IVF-flat index over a NativeVectorStore matrix: spherical k-means
+    centroids plus one inverted list of row indices per centroid. A query
+    scores only the rows in its `nprobe` closest lists, exactly, against
+    the store's own vectors (nothing is copied).
+
+    New rows are assigned to the existing centroids as they arrive; the
+    centroids are retrained once the store has doubled since training.
+    """
+
+    def __init__(self, nlist=None, nprobe=IVF_NPROBE):
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.centroids = None
+        self.assignments = np.zeros(0, dtype=np.int32)
+        self.trained_size = 0
+        self.lists = []
+
+    @property
+    def is_trained(self):
+        return self.centroids is not None
+
+    def needs_training(self, size):
+        return not self.is_trained or size > 2 * self.trained_size
+
+    def _assign(self, vectors):
+        assignments = np.empty(len(vectors), dtype=np.int32)
+        for start in range(0, len(vectors), ASSIGN_BLOCK):
+            block = np.asarray(vectors[start:start + ASSIGN_BLOCK], dtype=np.float32)
+            assignments[start:start + len(block)] = np.argmax(block @ self.centroids.T, axis=1)
+        return assignments
+
+    def _build_lists(self):
+        order = np.argsort(self.assignments, kind="stable")
+        bounds = np.searchsorted(self.assignments[order], np.arange(len(self.centroids) + 1))
+        self.lists = [[order[bounds[c]:bounds[c + 1]]] for c in range(len(self.centroids))]
+
+    def train(self, vectors, size, seed=0):
+        """Runs k-means on a sample of the first `size` rows and assigns all of them."""
+        nlist = self.nlist or int(np.clip(2 * np.sqrt(size), 16, 4096))
+        nlist = min(nlist, size)
+        rng = np.random.default_rng(seed)
+        sample_size = min(size, nlist * KMEANS_SAMPLE_PER_LIST)
+        sample = np.asarray(vectors[np.sort(rng.choice(size, sample_size, replace=False))], dtype=np.float32)
+        centroids = sample[rng.choice(sample_size, nlist, replace=False)].copy()
+        for _ in range(KMEANS_ITERATIONS):
+            self.centroids = centroids
+            labels = self._assign(sample)
+            # Per-list sums via one sort instead of an unbuffered scatter-add
+            order = np.argsort(labels, kind="stable")
+            counts = np.bincount(labels, minlength=nlist)
+            present = np.flatnonzero(counts)
+            sums = np.zeros_like(centroids)
+            sums[present] = np.add.reduceat(sample[order], np.concatenate([[0], np.cumsum(counts[present])[:-1]]))
+            # Empty lists restart from a random sample point
+            empty = counts == 0
+            sums[empty] = sample[rng.choice(sample_size, int(empty.sum()))]
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            centroids = sums / norms
+        self.centroids = centroids
+        self.assignments = self._assign(vectors[:size])
+        self.trained_size = size
+        self._build_lists()
+
+    def add(self, vectors, start):
+        """Assigns rows start..start+len(vectors) to their nearest lists."""
+        assignments = self._assign(vectors)
+        self.assignments = np.concatenate([self.assignments[:start], assignments])
+        for c in np.unique(assignments):
+            parts = self.lists[c] + [start + np.flatnonzero(assignments == c)]
+            if len(parts) > LIST_MAX_PARTS:
+                parts = [np.concatenate(parts)]
+            # Replaced, never mutated, so lock-free searches see a consistent list
+            self.lists[c] = parts
+        return assignments
+
+    def remap(self, keep):
+        """Drops rows not in `keep` (old indices, ascending) after a compaction."""
+        self.assignments = self.assignments[keep]
+        self._build_lists()
+
+    def _list(self, c):
+        # Runs without the store lock: read only, compaction happens in add()
+        parts = self.lists[c]
+        return parts[0] if len(parts) == 1 else np.concatenate(parts)
+
+    def search(self, vectors, queries, k, nprobe=None, deleted=None):
+        """
+        Returns (indices, scores) shaped (n, k), or None for a query whose
+        probed lists hold fewer than k live rows (callers fall back to exact).
+        """
+        nprobe = min(nprobe or self.nprobe, len(self.centroids))
+        probes = _top_k(queries @ self.centroids.T, nprobe)
+        results = []
+        for query, probe in zip(queries, probes):
+            candidates = np.concatenate([self._list(c) for c in probe])
+            if deleted is not None and len(deleted):
+                candidates = candidates[~np.isin(candidates, deleted)]
+            if len(candidates) < k:
+                results.append(None)
+                continue
+            # Sorted row order keeps reads from a memory-mapped matrix sequential
+            candidates = np.sort(candidates)
+            scores = np.asarray(vectors[candidates], dtype=np.float32) @ query
+            top = _top_k(scores, k)
+            results.append((candidates[top], scores[top]))
+        return results
 
 class NativeVectorStore:
-    def __init__(self):
-        self.documents = [] # List of {"text": ..., "vector": ...}
-        
-    def add_texts(self, texts):
-        if not client:
-            raise ValueError("Mistral API Key not set")
-            
+    """
+    Vector store backed by one contiguous float32 matrix.
+    Rows are L2-normalized on insert, so cosine similarity is a single
+    matrix-vector product.
+
+    Without `path` the matrix lives in memory and grows geometrically like
+    a list. With `path` the store is persisted as:
+        vectors.npy   - the matrix, memory-mapped read-only (zero-copy load)
+        chunks.jsonl  - one {"text", "metadata"} line per row, append-only
+        manifest.json - row count, dim and deleted rows
+    Appends write only the new rows; deletions are tombstones until compact().
+
+    With ann="ivf" (default from NATIVE_ANN) searches over stores of at least
+    NATIVE_ANN_MIN_ROWS rows go through an IVFIndex, trained lazily on first
+    search and persisted next to the vectors.
+    """
+
+    def __init__(self, dim=1024, initial_capacity=1024, path=None, ann=None, nprobe=None):
+        self.dim = dim
+        ann = NATIVE_ANN if ann is None else ann
+        self.index = IVFIndex(nprobe=nprobe or IVF_NPROBE) if ann == "ivf" else None
+        self.path = path
+        self.size = 0
+        self.texts = []
+        self.metadatas = []
+        self.deleted = set()
+        self._lock = threading.Lock()
+        self._text_bytes = (0, 0)  # (size it was computed at, bytes)
+        if path:
+            self._load()
+        else:
+            self.vectors = np.zeros((initial_capacity, dim), dtype=np.float32)
+
+    def __len__(self):
+        return self.size - len(self.deleted)
+
+    def memory_bytes(self):
+        """Approximate resident size: vectors, chunk texts and the ANN index."""
+        if self._text_bytes[0] != self.size:
+            self._text_bytes = (self.size, sum(len(t) for t in self.texts) + CHUNK_OVERHEAD_BYTES * self.size)
+        total = self.vectors.nbytes + self._text_bytes[1]
+        if self.index is not None and self.index.is_trained:
+            # Assignments plus the inverted lists built from them (int64)
+            total += self.index.centroids.nbytes + self.index.assignments.nbytes + 8 * len(self.index.assignments)
+        return total
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _load(self):
+        os.makedirs(self.path, exist_ok=True)
+        self.vectors = np.zeros((0, self.dim), dtype=np.float32)
+        manifest_path = self._file("manifest.json")
+        if not os.path.exists(manifest_path):
+            return
+        with open(manifest_path, "r") as f:
+            manifest = json.load(f)
+        self.dim = manifest["dim"]
+        count = manifest["count"]
+        if count:
+            self.vectors = np.load(self._file("vectors.npy"), mmap_mode="r")
+        with open(self._file("chunks.jsonl"), "r", encoding="utf-8") as f:
+            for line in f:
+                if len(self.texts) == count:
+                    break  # Rows written after the manifest by an interrupted append
+                chunk = json.loads(line)
+                self.texts.append(chunk["text"])
+                self.metadatas.append(chunk["metadata"])
+        # The manifest is written last, so it never counts rows that aren't on disk
+        self.size = min(count, len(self.vectors), len(self.texts))
+        self.deleted = {i for i in manifest.get("deleted", []) if i < self.size}
+        if self.index is not None and os.path.exists(self._file("ivf_centroids.npy")):
+            self._load_index(manifest.get("ivf_trained_size", self.size))
+        print(f"Loaded native store {self.path}: {len(self)} chunks")
+
+    def _save_manifest(self):
+        manifest = {"dim": self.dim, "count": self.size, "deleted": sorted(self.deleted)}
+        if self.index is not None and self.index.is_trained:
+            manifest["ivf_trained_size"] = self.index.trained_size
+        tmp_path = self._file("manifest.json.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, self._file("manifest.json"))
+
+    def _array_header(self, rows):
+        header = io.BytesIO()
+        np.lib.format.write_array_header_1_0(header, {"descr": "<f4", "fortran_order": False, "shape": (rows, self.dim)})
+        return header.getvalue()
+
+    def _append_rows(self, vectors):
+        """Appends rows to vectors.npy in place and re-maps it."""
+        path = self._file("vectors.npy")
+        header = self._array_header(self.size + len(vectors))
+        if self.size == 0 or not os.path.exists(path):
+            with open(path, "wb") as f:
+                f.write(header)
+                f.write(vectors.tobytes())
+        else:
+            with open(path, "r+b") as f:
+                np.lib.format.read_magic(f)
+                np.lib.format.read_array_header_1_0(f)
+                data_offset = f.tell()
+                # numpy pads the header so the row count can grow without moving the data
+                if len(header) != data_offset:
+                    raise ValueError("vectors.npy header has no room to grow; run compact()")
+                # Drop any rows past the manifest count left by an interrupted append
+                f.truncate(data_offset + self.size * self.dim * 4)
+                f.seek(0, os.SEEK_END)
+                f.write(vectors.tobytes())
+                f.flush()
+                f.seek(0)
+                f.write(header)
+        self.vectors = np.load(path, mmap_mode="r")
+
+    def _load_index(self, trained_size):
+        self.index.centroids = np.load(self._file("ivf_centroids.npy"))
+        self.index.trained_size = trained_size
+        self.index.assignments = np.fromfile(self._file("ivf_assign.bin"), dtype=np.int32)[:self.size]
+        self.index._build_lists()
+        done = len(self.index.assignments)
+        if done < self.size:
+            # Rows appended after the last assignment write
+            self.index.add(self.vectors[done:self.size], done)
+            self._save_index()
+
+    def _save_index(self):
+        np.save(self._file("ivf_centroids.npy"), self.index.centroids)
+        self.index.assignments.tofile(self._file("ivf_assign.bin"))
+
+    def _ensure_index(self):
+        """True if searches should use the ANN index; trains it when due."""
+        if self.index is None or len(self) < NATIVE_ANN_MIN_ROWS:
+            return False
+        with self._lock:
+            if self.index.needs_training(self.size):
+                print(f"Training IVF index on {self.size} vectors...")
+                self.index.train(self.vectors, self.size)
+                if self.path:
+                    self._save_index()
+                    self._save_manifest()
+        return True
+
+    def _reserve(self, extra):
+        needed = self.size + extra
+        if needed <= len(self.vectors):
+            return
+        capacity = max(needed, len(self.vectors) * 2)
+        grown = np.zeros((capacity, self.dim), dtype=np.float32)
+        grown[:self.size] = self.vectors[:self.size]
+        self.vectors = grown
+
+    @staticmethod
+    def _normalize(matrix):
+        matrix = np.asarray(matrix, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+        norms[norms == 0] = 1.0  # Zero vectors score 0 against everything
+        return matrix / norms
+
+    def add_vectors(self, vectors, texts, metadatas=None):
+        """Appends pre-computed embeddings with their texts."""
+        vectors = self._normalize(vectors).reshape(-1, self.dim)
+        metadatas = metadatas or [{} for _ in texts]
+        with self._lock:
+            if self.path:
+                self._append_rows(vectors)
+                with open(self._file("chunks.jsonl"), "a", encoding="utf-8") as f:
+                    for text, metadata in zip(texts, metadatas):
+                        f.write(json.dumps({"text": text, "metadata": metadata}) + "\n")
+            else:
+                self._reserve(len(vectors))
+                self.vectors[self.size:self.size + len(vectors)] = vectors
+            self.texts.extend(texts)
+            self.metadatas.extend(metadatas)
+            if self.index is not None and self.index.is_trained:
+                assignments = self.index.add(vectors, self.size)
+                if self.path:
+                    with open(self._file("ivf_assign.bin"), "ab") as f:
+                        f.write(assignments.tobytes())
+            self.size += len(vectors)
+            if self.path:
+                self._save_manifest()
+
+    def delete(self, indices):
+        """Hides rows from search. Space is reclaimed by compact()."""
+        with self._lock:
+            self.deleted.update(i for i in indices if 0 <= i < self.size)
+            if self.path:
+                self._save_manifest()
+
+    def compact(self):
+        """Rewrites the store without deleted rows. Row indices change."""
+        with self._lock:
+            keep = [i for i in range(self.size) if i not in self.deleted]
+            vectors = np.ascontiguousarray(self.vectors[keep], dtype=np.float32).reshape(-1, self.dim)
+            self.texts = [self.texts[i] for i in keep]
+            self.metadatas = [self.metadatas[i] for i in keep]
+            self.size = len(keep)
+            self.deleted = set()
+            if self.index is not None and self.index.is_trained:
+                self.index.remap(keep)
+                if self.path:
+                    self._save_index()
+            if not self.path:
+                self.vectors = vectors
+                return
+            # Write new files next to the old ones and swap them in
+            with open(self._file("vectors.npy.tmp"), "wb") as f:
+                f.write(self._array_header(len(vectors)))
+                f.write(vectors.tobytes())
+            with open(self._file("chunks.jsonl.tmp"), "w", encoding="utf-8") as f:
+                for text, metadata in zip(self.texts, self.metadatas):
+                    f.write(json.dumps({"text": text, "metadata": metadata}) + "\n")
+            self.vectors = None  # Release the old mapping before replacing the file
+            os.replace(self._file("vectors.npy.tmp"), self._file("vectors.npy"))
+            os.replace(self._file("chunks.jsonl.tmp"), self._file("chunks.jsonl"))
+            self._save_manifest()
+            self.vectors = np.load(self._file("vectors.npy"), mmap_mode="r") if self.size else vectors
+
+    def add_texts(self, texts, metadatas=None):
         print(f"Generating embeddings for {len(texts)} chunks...")
-        embeddings_batch_response = client.embeddings.create(
-            model="mistral-embed",
-            inputs=texts
-        )
-        
-        for i, text in enumerate(texts):
-            vector = embeddings_batch_response.data[i].embedding
-            self.documents.append({
-                "text": text,
-                "vector": np.array(vector)
-            })
-            
+        self.add_vectors(embedder.embed_documents(texts), texts, metadatas)
+
+    def search_vectors(self, query_vecs, k=3, nprobe=None, exact=False):
+        """
+        Top-k search for one query vector (dim,) or a batch (n, dim).
+        Returns (indices, scores) shaped (n, k), best first. Uses the ANN
+        index when enabled unless exact=True.
+        """
+        queries = self._normalize(np.atleast_2d(query_vecs))
+        k = min(k, len(self))
+        if k == 0:
+            return np.empty((len(queries), 0), dtype=np.int64), np.empty((len(queries), 0), dtype=np.float32)
+
+        if not exact and self._ensure_index():
+            deleted = np.fromiter(self.deleted, dtype=np.int64) if self.deleted else None
+            results = self.index.search(self.vectors, queries, k, nprobe, deleted)
+            for i, result in enumerate(results):
+                if result is None:
+                    indices, scores = self._exact_search(queries[i:i + 1], k)
+                    results[i] = (indices[0], scores[0])
+            return np.stack([r[0] for r in results]), np.stack([r[1] for r in results])
+        return self._exact_search(queries, k)
+
+    def _exact_search(self, queries, k):
+        scores = queries @ self.vectors[:self.size].T
+        if self.deleted:
+            scores[:, list(self.deleted)] = -np.inf
+        top = _top_k(scores, k)
+        return top, np.take_along_axis(scores, top, axis=1)
+
     def similarity_search(self, query, k=3):
-        if not client:
-            raise ValueError("Mistral API Key not set")
-            
-        # Get query vector
-        query_response = client.embeddings.create(
-            model="mistral-embed",
-            inputs=[query]
-        )
-        query_vec = np.array(query_response.data[0].embedding)
-        
-        scores = []
-        for doc in self.documents:
-            doc_vec = doc["vector"]
-            # Cosine Similarity: (A . B) / (||A|| * ||B||)
-            # Mistral embeddings are usually normalized, so just dot product suffices,
-            # but we'll do full cosine to be safe.
-            norm_q = np.linalg.norm(query_vec)
-            norm_d = np.linalg.norm(doc_vec)
-            
-            if norm_q == 0 or norm_d == 0:
-                score = 0
-            else:
-                score = np.dot(query_vec, doc_vec) / (norm_q * norm_d)
-            
-            scores.append((score, doc["text"]))
-            
-        # Sort by score descending
-        scores.sort(key=lambda x: x[0], reverse=True)
-        
-        # Return top k texts
-        return [text for score, text in scores[:k]]
-
-# Global instance for simplicity in this MVP
-native_db = NativeVectorStore()
+        return self.similarity_search_batch([query], k)[0]
+
+    def similarity_search_batch(self, queries, k=3):
+        """Embeds all queries together (repeats hit the query cache) and returns top-k texts per query."""
+        if len(self) == 0:
+            return [[] for _ in queries]
+        indices, _ = self.search_vectors(embedder.embed_queries(queries), k)
+        return [[self.texts[i] for i in row] for row in indices]
+
+def namespace_key(user, doc_set="default"):
+    """Filesystem-safe namespace for a user's document set."""
+    clean = lambda part: re.sub(r"[^A-Za-z0-9_.-]", "_", str(part or "default")).strip(".") or "default"
+    return f"{clean(user)}/{clean(doc_set)}"
+
+class NativeStoreManager:
+    """
+    Gives every user / document set its own persisted NativeVectorStore.
+
+    Loaded stores are kept in LRU order. When their combined memory_bytes()
+    exceeds the budget, the least recently used ones are unloaded; they are
+    already on disk (appends write through), so unloading just drops them
+    and the next use() reloads them. Stores inside a use() block are
+    pinned and never unloaded.
+    """
+
+    def __init__(self, root=NATIVE_STORE_DIR, budget_bytes=NATIVE_MEMORY_BUDGET_MB * 1024 * 1024):
+        self.root = root
+        self.budget_bytes = budget_bytes
+        self._stores = OrderedDict()  # namespace -> store, least recently used first
+        self._pins = {}
+        self._last_used = {}
+        self._lock = threading.Lock()
+
+    def _get(self, namespace):
+        store = self._stores.get(namespace)
+        if store is None:
+            store = NativeVectorStore(path=os.path.join(self.root, *namespace.split("/")))
+            self._stores[namespace] = store
+        self._stores.move_to_end(namespace)
+        self._last_used[namespace] = time.time()
+        return store
+
+    @contextmanager
+    def use(self, user, doc_set="default"):
+        """Yields the namespace's store, loading it if needed and pinning it meanwhile."""
+        namespace = namespace_key(user, doc_set)
+        with self._lock:
+            store = self._get(namespace)
+            self._pins[namespace] = self._pins.get(namespace, 0) + 1
+        try:
+            yield store
+        finally:
+            with self._lock:
+                self._pins[namespace] -= 1
+                if not self._pins[namespace]:
+                    del self._pins[namespace]
+                # The store may have grown while pinned
+                self._enforce_budget()
+
+    def _enforce_budget(self):
+        total = sum(store.memory_bytes() for store in self._stores.values())
+        for namespace in list(self._stores):
+            if total <= self.budget_bytes:
+                return
+            if namespace in self._pins:
+                continue
+            total -= self._stores.pop(namespace).memory_bytes()
+            print(f"Unloaded native store {namespace} (memory budget)")
+        if total > self.budget_bytes:
+            print(f"Native stores use {total / 2**20:.0f}MB, over the {self.budget_bytes / 2**20:.0f}MB budget, but all are in use")
+
+    def doc_sets(self, user):
+        """Document sets of a user that exist on disk or are loaded."""
+        prefix = namespace_key(user, "x").split("/")[0]
+        names = set()
+        user_dir = os.path.join(self.root, prefix)
+        if os.path.isdir(user_dir):
+            names.update(entry.name for entry in os.scandir(user_dir) if entry.is_dir())
+        with self._lock:
+            names.update(ns.split("/", 1)[1] for ns in self._stores if ns.startswith(prefix + "/"))
+        return sorted(names)
+
+    def memory_report(self):
+        """Per loaded namespace: chunks, memory bytes and last use, most recent first."""
+        with self._lock:
+            rows = [
+                {"namespace": ns, "chunks": len(store), "bytes": store.memory_bytes(),
+                 "last_used": self._last_used.get(ns), "pinned": ns in self._pins}
+                for ns, store in self._stores.items()
+            ]
+        return {"budget_bytes": self.budget_bytes, "total_bytes": sum(r["bytes"] for r in rows), "namespaces": rows[::-1]}
+
+# Process-wide manager; sessions get their store with native_stores.use(user, doc_set)
+native_stores = NativeStoreManager()
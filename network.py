@@ -1,25 +1,152 @@
+import os
 import time
+import threading
+from collections import deque
 import requests
+from requests.adapters import HTTPAdapter
+from tracing import span
 
-def measure_latency(host="https://www.google.com", timeout=2):
+# Latency is probed against the LLM API itself (any HTTP answer, even 401,
+# measures the round trip). Point it at a local fake server in tests.
+LATENCY_PROBE_URL = os.getenv("LATENCY_PROBE_URL") or (
+    (os.getenv("MISTRAL_SERVER_URL") or "https://api.mistral.ai").rstrip("/") + "/v1/models"
+)
+PROBE_INTERVAL = float(os.getenv("LATENCY_PROBE_INTERVAL", "15"))
+PROBE_TIMEOUT = 2
+# Recorded for a failed probe or request, so the mode drops to FAST
+FAILURE_LATENCY_MS = 9999
+# Weight of the newest sample in the moving average
+EWMA_ALPHA = 0.3
+WINDOW_SIZE = 50
+# Used until the first probe completes (STANDARD mode)
+INITIAL_LATENCY_MS = 200
+
+class LatencyMonitor:
     """
-    Measures latency to a reliable host to determine network conditions.
-    Returns average latency in milliseconds.
+    Keeps a running estimate of latency to the LLM endpoint.
+
+    A daemon thread probes LATENCY_PROBE_URL every PROBE_INTERVAL seconds
+    over one keep-alive session. Real requests feed in passively: their time
+    to first byte is an upper bound on the round trip, so it can only pull
+    the estimate down, while a failed request counts as FAILURE_LATENCY_MS.
+    Probes are skipped while recorded samples keep the estimate fresh.
+    Reading the estimate never blocks.
     """
-    latencies = []
-    # Take 3 measurements
-    for _ in range(3):
-        try:
-            start_time = time.time()
-            requests.get(host, timeout=timeout)
-            end_time = time.time()
-            latencies.append((end_time - start_time) * 1000)
-        except requests.RequestException:
-            # If request fails, assume very high latency
-            latencies.append(9999) 
-    
-    avg_latency = sum(latencies) / len(latencies)
-    return avg_latency
+
+    def __init__(self, url=LATENCY_PROBE_URL, interval=PROBE_INTERVAL):
+        self.url = url
+        self.interval = interval
+        self.session = requests.Session()
+        self.session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=1))
+        self.session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=1))
+        api_key = os.getenv("MISTRAL_API_KEY")
+        if api_key:
+            self.session.headers["Authorization"] = f"Bearer {api_key}"
+        self.ewma = None
+        self.window = deque(maxlen=WINDOW_SIZE)
+        self.last_sample_at = 0.0
+        self.probes = 0
+        self.passive_samples = 0
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def record(self, latency_ms):
+        with self._lock:
+            self.ewma = latency_ms if self.ewma is None else EWMA_ALPHA * latency_ms + (1 - EWMA_ALPHA) * self.ewma
+            self.window.append(latency_ms)
+            self.last_sample_at = time.time()
+
+    def probe(self):
+        """Measures one round trip now and records it."""
+        with span("latency_probe") as attrs:
+            start = time.perf_counter()
+            try:
+                self.session.get(self.url, timeout=PROBE_TIMEOUT)
+                latency_ms = (time.perf_counter() - start) * 1000
+            except requests.RequestException:
+                latency_ms = FAILURE_LATENCY_MS
+                attrs["failed"] = True
+        self.probes += 1
+        self.record(latency_ms)
+        return latency_ms
+
+    def observe_request(self, first_byte_ms):
+        """Passive sample from a real LLM call (time until the first byte / token)."""
+        self.passive_samples += 1
+        with self._lock:
+            current = self.ewma
+        # A slower sample includes model time, so it says nothing about the
+        # network and is dropped. It must not defer the next probe either:
+        # only probes can raise the estimate when the network gets slower.
+        if current is None or first_byte_ms < current:
+            self.record(first_byte_ms)
+
+    def observe_failure(self):
+        self.passive_samples += 1
+        self.record(FAILURE_LATENCY_MS)
+
+    def latency_ms(self):
+        with self._lock:
+            return INITIAL_LATENCY_MS if self.ewma is None else self.ewma
+
+    def percentile(self, q):
+        with self._lock:
+            samples = sorted(self.window)
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(q / 100 * len(samples)))]
+
+    def snapshot(self):
+        latency = self.latency_ms()
+        return {
+            "latency_ms": latency,
+            "mode": get_network_mode(latency),
+            "p50_ms": self.percentile(50),
+            "p95_ms": self.percentile(95),
+            "samples": len(self.window),
+            "probes": self.probes,
+            "passive_samples": self.passive_samples,
+            "age_s": time.time() - self.last_sample_at if self.last_sample_at else None,
+        }
+
+    def _loop(self):
+        while True:
+            if time.time() - self.last_sample_at >= self.interval:
+                self.probe()
+            time.sleep(min(1.0, self.interval))
+
+    def start(self):
+        """Starts the background probe thread once."""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, daemon=True, name="latency-monitor")
+                self._thread.start()
+        return self
+
+_monitor = None
+_monitor_lock = threading.Lock()
+
+def get_monitor():
+    """Process-wide latency monitor, started on first use."""
+    global _monitor
+    with _monitor_lock:
+        if _monitor is None:
+            _monitor = LatencyMonitor().start()
+    return _monitor
+
+def measure_latency(host=None, timeout=PROBE_TIMEOUT):
+    """
+    Measures latency to `host` (default: the LLM endpoint) right now.
+    Returns latency in milliseconds.
+    """
+    if host is None:
+        return get_monitor().probe()
+    start_time = time.time()
+    try:
+        requests.get(host, timeout=timeout)
+    except requests.RequestException:
+        return FAILURE_LATENCY_MS
+    return (time.time() - start_time) * 1000
 
 def get_network_mode(latency_ms):
     """
@@ -36,6 +163,9 @@ def get_network_mode(latency_ms):
         return "FAST"
 
 if __name__ == "__main__":
-    lat = measure_latency()
+    monitor = LatencyMonitor()
+    for _ in range(3):
+        monitor.probe()
+    lat = monitor.latency_ms()
     mode = get_network_mode(lat)
-    print(f"Latency: {lat:.2f}ms | Mode: {mode}")
+    print(f"Latency: {lat:.2f}ms | Mode: {mode} | {monitor.snapshot()}")
@@ -15,6 +15,8 @@ You should think step-by-step to answer the user's request.
 You have access to the following tools: {tools}
 
 Question: {question}
+Context from the repository (if any):
+{context}
 
 Begin your reasoning:
 1. Analyze the request.
@@ -30,6 +32,8 @@ You must use a "Tree of Thoughts" approach to solve this problem.
 
 Question: {question}
 Tools Available: {tools}
+Context from the repository (if any):
+{context}
 
 Instructions:
 1. Brainstorm 3 distinct approaches to solve this problem.
@@ -40,3 +44,42 @@ Instructions:
 
 Output your internal monologue and then the final answer.
 """
+
+# Tree of Thoughts, one LLM call per step (see tree_of_thought.py)
+TOT_BRANCH_PROMPT = """
+You are an advanced AI operating in DEEP MODE, brainstorming one of {branches} approaches to a problem.
+Propose approach #{index}. Make it distinct from the obvious first idea if #{index} > 1.
+Describe the approach and its key steps briefly; do not write the final answer yet.
+
+Question: {question}
+Tools Available: {tools}
+Context from the repository (if any):
+{context}
+
+Approach #{index}:
+"""
+
+TOT_CRITIQUE_PROMPT = """
+Critique this approach to the question for completeness and accuracy, in at most three sentences.
+End with a line "SCORE: n" where n is 1 (useless) to 10 (clearly correct and complete).
+
+Question: {question}
+
+Approach:
+{approach}
+
+Critique:
+"""
+
+TOT_ANSWER_PROMPT = """
+You are an advanced AI operating in DEEP MODE. Several approaches were considered and this one was selected:
+{approach}
+
+Execute it and provide a comprehensive final answer to the question.
+
+Question: {question}
+Context from the repository (if any):
+{context}
+
+Answer:
+"""
@@ -1,55 +1,214 @@
 import os
+import re
+import time
+import threading
 from langchain_mistralai import ChatMistralAI
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
-from langchain_core.runnables import RunnablePassthrough
-from db import get_vector_store
+from db import get_vector_store, build_filter, get_search_params, fetch_documents
+import lexical_index
+from response_cache import get_cache, replay
+from tracing import span, record
+from context_packer import pack_context, CONTEXT_BUDGETS, CONTEXT_CANDIDATES
+from mistral_embeddings import MISTRAL_SERVER_URL
 
-def format_docs(docs):
-    return "\n\n".join(f"[Source: {doc.metadata.get('file_path', 'unknown')}]\n{doc.page_content}" for doc in docs)
+# Hybrid retrieval: candidates pulled from each side before fusion
+HYBRID_CANDIDATES = 20
+RRF_K = 60  # Reciprocal rank fusion constant
 
-def ask_question(collection_name: str, query: str, api_key: str):
-    """
-    Queries the RAG pipeline.
-    """
-    if not collection_name:
-        return "Please ingest a repository first."
-
-    # Initialize LLM
-    llm = ChatMistralAI(
-        mistral_api_key=api_key,
-        model="mistral-tiny", # Efficient model
-        temperature=0.2
-    )
-    
-    # Get Retriever
-    vector_store = get_vector_store(collection_name)
-    retriever = vector_store.as_retriever(search_kwargs={"k": 5})
-    
-    # Simple RAG Prompt
-    template = """Answer the question based only on the following context. 
+RAG_MODEL = "mistral-tiny"  # Efficient model
+RAG_PROMPT = ChatPromptTemplate.from_template("""Answer the question based only on the following context. 
     If you cannot answer the question based on the context, say "I don't find this info in the code".
     
     Context:
     {context}
     
     Question: {question}
+    """)
+
+# "in the api/ folder", "inside src/utils directory", ...
+FOLDER_PATTERN = re.compile(r"\b(?:in|inside|under|within)\s+(?:the\s+)?`?(?!(?:the|this|that|a|an)\b)([\w.\-]+(?:/[\w.\-]+)*)/?`?\s+(?:folder|directory|dir|package|module)\b", re.IGNORECASE)
+
+def extract_path_filter(query: str):
+    """Picks an explicit folder reference out of the question, if there is one."""
+    match = FOLDER_PATTERN.search(query)
+    return match.group(1) if match else None
+
+# "ingest_repo", "where is `NativeVectorStore` defined?", "what does db.get_vector_store do"
+IDENTIFIER_LOOKUP = re.compile(
+    r"^\s*(?:(?:where\s+is|where's|find|show(?:\s+me)?|locate|definition\s+of|what\s+(?:is|does))\s+(?:the\s+)?)?"
+    r"`?([A-Za-z_][\w.]*)`?(?:\(\))?"
+    r"(?:\s+(?:defined|declared|implemented|do|does|function|class|method))?\s*\??\s*$",
+    re.IGNORECASE,
+)
+
+# "README.md", "`config.py`": file names, not symbols
+FILE_NAME = re.compile(r"\.(?:py|jsx?|tsx?|md|rst|txt|json|ya?ml|toml|cfg|ini|sh|go|rs|java|c|h|cpp)$", re.IGNORECASE)
+
+def extract_identifier(query: str):
+    """Returns the identifier if the question is a pure symbol lookup, else None."""
+    match = IDENTIFIER_LOOKUP.match(query)
+    if not match:
+        return None
+    identifier = match.group(1)
+    if FILE_NAME.search(identifier):
+        return None
+    # Plain English words ("what is caching?") and dotted library names
+    # ("what does os.path do") aren't lookups of a symbol in this repo
+    looks_like_code = "`" in query or "_" in identifier or re.search(r"[a-z][A-Z]", identifier)
+    return identifier if looks_like_code else None
+
+def retrieve(collection_name: str, query: str, k: int = 5, path: str = None, language=None, timings=None):
     """
-    prompt = ChatPromptTemplate.from_template(template)
-    
-    # RAG Chain
-    rag_chain = (
-        {"context": retriever | format_docs, "question": RunnablePassthrough()}
-        | prompt
-        | llm
-        | StrOutputParser()
-    )
-    
-    # Retrieve docs separately for sources display
-    docs = retriever.invoke(query)
-    sources = [doc.metadata.get('file_path') for doc in docs]
-    
-    # Execute chain
-    response = rag_chain.invoke(query)
-    
-    return response, sources
+    Hybrid retrieval: BM25 over the collection's lexical index fused with
+    dense vector search via reciprocal rank fusion. Pure identifier lookups
+    are answered from the lexical index alone, without embedding the query.
+    If `timings` is a dict, embed / search seconds are added to it.
+    """
+    with span("retrieval", collection=collection_name):
+        return _hybrid_search(collection_name, query, k, path, language, {} if timings is None else timings)
+
+def _hybrid_search(collection_name, query, k, path, language, timings):
+    timings.setdefault("embed", 0.0)
+    start = time.perf_counter()
+    lexical = lexical_index.get_index(collection_name)
+
+    identifier = extract_identifier(query)
+    if identifier:
+        hits = lexical.search(identifier, k, path=path, language=language, exact=True)
+        docs = fetch_documents(collection_name, [point_id for point_id, _ in hits]) if hits else []
+        # Stale lexical IDs (missing points) fall through to the hybrid search
+        if docs and len(docs) == len(hits):
+            timings["search"] = time.perf_counter() - start
+            return docs
+
+    vector_store = get_vector_store(collection_name)
+    search_kwargs = {}
+    search_filter = build_filter(path=path, language=language)
+    if search_filter is not None:
+        search_kwargs["filter"] = search_filter
+    search_params = get_search_params()
+    if search_params is not None:
+        search_kwargs["search_params"] = search_params
+    # Embed explicitly so the two stages can be timed apart
+    embed_start = time.perf_counter()
+    with span("embedding"):
+        query_vector = vector_store.embeddings.embed_query(query)
+    timings["embed"] = time.perf_counter() - embed_start
+    dense = vector_store.similarity_search_by_vector(query_vector, k=HYBRID_CANDIDATES, **search_kwargs)
+    sparse = lexical.search(query, HYBRID_CANDIDATES, path=path, language=language)
+
+    scores = {}
+    docs_by_id = {}
+    for rank, doc in enumerate(dense):
+        point_id = str(doc.metadata.get("_id"))
+        docs_by_id[point_id] = doc
+        scores[point_id] = scores.get(point_id, 0.0) + 1.0 / (RRF_K + rank + 1)
+    for rank, (point_id, _) in enumerate(sparse):
+        scores[point_id] = scores.get(point_id, 0.0) + 1.0 / (RRF_K + rank + 1)
+
+    top_ids = [point_id for point_id, _ in sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]]
+    missing = [point_id for point_id in top_ids if point_id not in docs_by_id]
+    for doc in fetch_documents(collection_name, missing):
+        docs_by_id[str(doc.metadata["_id"])] = doc
+    timings["search"] = time.perf_counter() - start - timings["embed"]
+    return [docs_by_id[point_id] for point_id in top_ids if point_id in docs_by_id]
+
+def build_context(collection_name: str, query: str, mode: str = "RAG", path: str = None, language=None,
+                  k: int = CONTEXT_CANDIDATES, timings=None):
+    """
+    Retrieves `k` chunks and packs them into the token budget
+    of `mode` (see context_packer). Returns (context, sources, stats).
+    """
+    docs = retrieve(collection_name, query, k=k, path=path or extract_path_filter(query),
+                    language=language, timings=timings)
+    with span("prompt_build", mode=mode):
+        context, stats = pack_context(docs, CONTEXT_BUDGETS.get(mode, CONTEXT_BUDGETS["RAG"]))
+    sources = list(dict.fromkeys(doc.metadata.get('file_path') for doc in docs))
+    return context, sources, stats
+
+class RagEngine:
+    """
+    Long-lived RAG pipeline: the LLM client and chain are built once, vector
+    stores and lexical indexes come from the per-collection caches in db /
+    lexical_index. Each question retrieves once; the same documents feed the
+    prompt and the sources list. Answers stream token by token.
+
+    Stage timings (seconds) of the latest question are in `last_timings`:
+    embed, search, first_token, generate and total.
+    """
+
+    def __init__(self, api_key: str, model: str = RAG_MODEL, temperature: float = 0.2):
+        self.model = model
+        # Same endpoint override as the embedding and agent clients (e.g. a local stand-in)
+        endpoint = f"{MISTRAL_SERVER_URL.rstrip('/')}/v1" if MISTRAL_SERVER_URL else None
+        self.llm = ChatMistralAI(mistral_api_key=api_key, model=model, temperature=temperature, endpoint=endpoint)
+        self.chain = RAG_PROMPT | self.llm | StrOutputParser()
+        self.cache = get_cache()
+        self.last_timings = {}
+
+    def stream(self, collection_name: str, query: str, path: str = None, language=None, k: int = CONTEXT_CANDIDATES):
+        """
+        Retrieves, then returns (token iterator, sources, timings) without
+        waiting for generation. `timings` is filled in as the stream is consumed.
+        """
+        start = time.perf_counter()
+        timings = {}
+        self.last_timings = timings
+
+        # Filters change the answer, so they are part of the cache scope
+        cache_mode = f"rag:{path or ''}:{language or ''}"
+        cached = self.cache.get(query, cache_mode, collection_name, self.model)
+        if cached:
+            timings["total"] = time.perf_counter() - start
+            return replay(cached["answer"]), cached["sources"], timings
+
+        context, sources, packed = build_context(collection_name, query, "RAG", path=path, language=language,
+                                                 k=k, timings=timings)
+
+        def tokens():
+            generate_start = time.perf_counter()
+            parts = []
+            for token in self.chain.stream({"context": context, "question": query}):
+                if not parts:
+                    timings["first_token"] = time.perf_counter() - generate_start
+                    record("ttft", timings["first_token"])
+                parts.append(token)
+                yield token
+            timings["generate"] = time.perf_counter() - generate_start
+            record("generation", timings["generate"], tokens=len(parts),
+                   tokens_per_s=len(parts) / timings["generate"] if timings["generate"] else 0.0)
+            timings["total"] = time.perf_counter() - start
+            print("RAG timings: " + ", ".join(f"{stage} {secs * 1000:.0f}ms" for stage, secs in timings.items()))
+            print(f"RAG context: ~{packed['tokens']}/{packed['budget']} tokens, "
+                  f"{packed['blocks']} blocks from {packed['chunks']} chunks")
+            self.cache.put(query, cache_mode, "".join(parts), collection_name, self.model, sources=sources)
+
+        return tokens(), sources, timings
+
+    def ask(self, collection_name: str, query: str, path: str = None, language=None, k: int = CONTEXT_CANDIDATES):
+        """Blocking variant: returns (answer, sources)."""
+        tokens, sources, _ = self.stream(collection_name, query, path=path, language=language, k=k)
+        return "".join(tokens), sources
+
+_engines = {}
+_engines_lock = threading.Lock()
+
+def get_engine(api_key: str):
+    """One RagEngine per API key for the life of the process."""
+    with _engines_lock:
+        engine = _engines.get(api_key)
+        if engine is None:
+            engine = RagEngine(api_key)
+            _engines[api_key] = engine
+        return engine
+
+def ask_question(collection_name: str, query: str, api_key: str, path: str = None, language=None):
+    """
+    Queries the RAG pipeline.
+    `path` / `language` restrict retrieval and are pushed down to Qdrant as a
+    payload filter. If no path is given, a folder named in the question is used.
+    """
+    if not collection_name:
+        return "Please ingest a repository first."
+    return get_engine(api_key).ask(collection_name, query, path=path, language=language)
@@ -1,73 +1,226 @@
 import os
-from mistralai import Mistral
+import asyncio
 from dotenv import load_dotenv
 
 from prompt_templates import FAST_PROMPT, STANDARD_PROMPT, DEEP_PROMPT
-from network import measure_latency, get_network_mode
+from network import get_monitor, get_network_mode
 from tools import TOOLS
+from response_cache import get_cache, replay
+from rag import build_context
+from llm_client import get_llm_client
+from tree_of_thought import TreeOfThought, TOT_BRANCHES
+from tracing import get_tracer, trace_tokens, atrace_tokens
 
 load_dotenv()
 
+# Seconds each mode may wait for the first token before degrading
+LLM_BUDGETS = {
+    "FAST": float(os.getenv("LLM_BUDGET_FAST", "8")),
+    "STANDARD": float(os.getenv("LLM_BUDGET_STANDARD", "20")),
+    "DEEP": float(os.getenv("LLM_BUDGET_DEEP", "40")),
+}
+# Budget for the short context-free retry after a mode's budget ran out
+LLM_DEGRADED_BUDGET = float(os.getenv("LLM_DEGRADED_BUDGET", "8"))
+NO_API_KEY_MESSAGE = "Error: Mistral API Key not set."
+
 class AdaptiveAgent:
+    """
+    Picks a reasoning mode from network latency and answers through the
+    shared LLMClient. `arun` / `astream` are the asyncio API; `run` and
+    `call_llm` are sync wrappers for the Streamlit UI. `user` keys the
+    fair queue in front of the upstream API.
+    """
+
     def __init__(self):
         self.api_key = os.getenv("MISTRAL_API_KEY")
-        self.client = Mistral(api_key=self.api_key) if self.api_key else None
-        
-    def call_llm(self, prompt, stream=False):
-        if not self.client:
-            return "Error: Mistral API Key not set."
-        
-        if stream:
-            stream_response = self.client.chat.stream(
-                model="mistral-tiny",
-                messages=[{"role": "user", "content": prompt}],
-            )
-            for chunk in stream_response:
-                if chunk.data.choices[0].delta.content:
-                    yield chunk.data.choices[0].delta.content
-        else:
-            response = self.client.chat.complete(
-                model="mistral-tiny",
-                messages=[{"role": "user", "content": prompt}],
-            )
-            return response.choices[0].message.content
-
-    def run(self, question, context=None, stream=False):
-        # 1. Sense Network
-        latency = measure_latency()
+        self.llm = get_llm_client() if self.api_key else None
+        self.tot = TreeOfThought(self.llm) if self.llm else None
+        self.monitor = get_monitor()
+        self.cache = get_cache()
+        self.degraded = {"cache": 0, "short_prompt": 0}
+
+    def call_llm(self, prompt, stream=False, user=None, mode=None):
+        """Single call within the mode's first-token budget (LLM_BUDGETS); no degradation."""
+        if not self.llm:
+            return NO_API_KEY_MESSAGE
+        tokens = self.llm.stream(prompt, user=user, timeout=LLM_BUDGETS.get(mode))
+        return tokens if stream else "".join(tokens)
+
+    async def acall_llm(self, prompt, user=None, mode=None):
+        if not self.llm:
+            return NO_API_KEY_MESSAGE
+        return "".join([token async for token in self.llm.astream(prompt, user=user, timeout=LLM_BUDGETS.get(mode))])
+
+    def _prepare(self, question, context, collection):
+        """Mode selection, cache lookup and context retrieval. Returns (mode, latency, cached, context)."""
+        # 1. Sense Network (cached estimate from the background monitor)
+        latency = self.monitor.latency_ms()
         mode = get_network_mode(latency)
         
         print(f"Network Latency: {latency:.1f}ms -> Mode: {mode}")
-        
+
+        # Repeated (or near-identical) questions are answered from the cache
+        cached = self.cache.get(question, mode, collection) if self.llm else None
+        if cached:
+            print(f"Response cache hit ({cached['match']})")
+            return mode, latency, cached, None
+        if context is None and collection:
+            # Only retrieve on a cache miss; the budget depends on the mode
+            try:
+                context, _, packed = build_context(collection, question, mode)
+                print(f"Context: ~{packed['tokens']}/{packed['budget']} tokens, "
+                      f"{packed['blocks']} blocks from {packed['chunks']} chunks "
+                      f"({packed['merged']} merged, {packed['duplicates']} duplicates dropped)")
+            except Exception as e:
+                print(f"Context retrieval failed for {collection}: {e}")
+        return mode, latency, None, context
+
+    def _use_tree(self, mode):
+        return mode == "DEEP" and self.tot is not None and TOT_BRANCHES > 1
+
+    def _degraded_answer(self, question, collection):
+        """
+        Fallback once a mode's budget is spent: a cached answer from any mode,
+        else a short context-free FAST prompt. Returns ("cache", answer) or
+        ("short_prompt", prompt).
+        """
+        vector = None
+        for mode in LLM_BUDGETS:
+            # Exact lookups first, so a hit never pays for an embedding
+            cached = self.cache.get(question, mode, collection, semantic=False)
+            if cached:
+                return "cache", cached["answer"]
+        for mode in LLM_BUDGETS:
+            if vector is None:
+                vector = self.cache.embed(question)
+            cached = self.cache.get(question, mode, collection, vector=vector)
+            if cached:
+                return "cache", cached["answer"]
+        return "short_prompt", FAST_PROMPT.format(question=question, context="None")
+
+    def _degrade(self, mode, question, collection):
+        kind, text = self._degraded_answer(question, collection)
+        self.degraded[kind] += 1
+        print(f"{mode} budget of {LLM_BUDGETS[mode]:g}s exhausted; degraded to {kind}")
+        return kind, text
+
+    def _generate(self, mode, question, context, collection, user, outcome):
+        """
+        Token stream for a cache miss, within the mode's first-token budget.
+        Sets outcome["degraded"] when the answer came from the fallback.
+        """
+        if self._use_tree(mode):
+            tokens = self.tot.stream(question, context, self._tool_names(), user, budget=LLM_BUDGETS[mode])
+        else:
+            tokens = self.llm.stream(self._build_prompt(mode, question, context), user=user, timeout=LLM_BUDGETS[mode])
+        try:
+            first = next(tokens)
+        except StopIteration:
+            return
+        except TimeoutError:
+            kind, text = self._degrade(mode, question, collection)
+            outcome["degraded"] = kind
+            tokens = replay(text) if kind == "cache" else self.llm.stream(text, user=user, timeout=LLM_DEGRADED_BUDGET)
+            first = next(tokens, None)
+            if first is None:
+                return
+        yield first
+        yield from tokens
+
+    def _cache_after(self, tokens, question, mode, collection, outcome):
+        parts = []
+        for token in tokens:
+            parts.append(token)
+            yield token
+        # A fallback answer must not stand in for the real one later
+        if not outcome.get("degraded"):
+            self.cache.put(question, mode, "".join(parts), collection)
+
+    def run(self, question, context=None, stream=False, collection=None, user=None):
+        mode, latency, cached, context = self._prepare(question, context, collection)
+        if cached:
+            return (trace_tokens(replay(cached["answer"])) if stream else cached["answer"]), mode, latency
+        if not self.llm:
+            return NO_API_KEY_MESSAGE, mode, latency
+        outcome = {}
+        tokens = trace_tokens(self._cache_after(self._generate(mode, question, context, collection, user, outcome),
+                                                question, mode, collection, outcome))
+        return (tokens if stream else "".join(tokens)), mode, latency
+
+    async def arun(self, question, context=None, collection=None, user=None):
+        """Async run(): returns (answer, mode, latency)."""
+        tokens, mode, latency = await self.astream(question, context, collection, user)
+        return "".join([token async for token in tokens]), mode, latency
+
+    async def astream(self, question, context=None, collection=None, user=None):
+        """Async run(stream=True): returns (async token iterator, mode, latency)."""
+        # Cache and retrieval are blocking (SQLite / Qdrant), so they run off the event loop
+        mode, latency, cached, context = await asyncio.to_thread(self._prepare, question, context, collection)
+        if cached:
+            return atrace_tokens(self._areplay(cached["answer"])), mode, latency
+        if not self.llm:
+            return self._areplay(NO_API_KEY_MESSAGE), mode, latency
+        return atrace_tokens(self._agenerate(mode, question, context, collection, user)), mode, latency
+
+    async def _areplay(self, text):
+        for piece in replay(text):
+            yield piece
+
+    async def _agenerate(self, mode, question, context, collection, user):
+        """Async _generate() + _cache_after()."""
+        if self._use_tree(mode):
+            tokens = self.tot.astream(question, context, self._tool_names(), user, budget=LLM_BUDGETS[mode])
+        else:
+            tokens = self.llm.astream(self._build_prompt(mode, question, context), user=user, timeout=LLM_BUDGETS[mode])
+        degraded = None
+        try:
+            first = await tokens.__anext__()
+        except StopAsyncIteration:
+            return
+        except TimeoutError:
+            degraded, text = await asyncio.to_thread(self._degrade, mode, question, collection)
+            tokens = (self._areplay(text) if degraded == "cache"
+                      else self.llm.astream(text, user=user, timeout=LLM_DEGRADED_BUDGET))
+            first = await anext(tokens, None)
+            if first is None:
+                return
+        parts = [first]
+        yield first
+        async for token in tokens:
+            parts.append(token)
+            yield token
+        # A fallback answer must not stand in for the real one later
+        if not degraded:
+            await asyncio.to_thread(self.cache.put, question, mode, "".join(parts), collection)
+
+    def stats(self):
+        stats = dict(self.llm.stats()) if self.llm else {}
+        stats.update({f"degraded_{kind}": count for kind, count in self.degraded.items()})
+        return stats
+
+    def _build_prompt(self, mode, question, context):
         # 2. Select Strategy
-        # Note: Deep Mode returns a full string because of internal logic, 
-        # but we can simulate streaming or just return it.
-        # Fast & Standard can stream directly.
-        
         if mode == "FAST":
-            response = self._fast_mode(question, context, stream)
-            return response, mode, latency
+            return self._fast_prompt(question, context)
         elif mode == "STANDARD":
-            response = self._standard_mode(question, stream)
-            return response, mode, latency
+            return self._standard_prompt(question, context)
         else:
-            # Deep mode is complex, for MVP let's just stream the final prompt
-            response = self._deep_mode(question, stream)
-            return response, mode, latency
+            # Single-completion Tree of Thoughts, used when TOT_BRANCHES <= 1
+            return self._deep_prompt(question, context)
+
+    def _tool_names(self):
+        return ", ".join(TOOLS.keys())
 
-    def _fast_mode(self, question, context, stream=False):
-        prompt = FAST_PROMPT.format(question=question, context=context or "None")
-        return self.call_llm(prompt, stream)
+    def _fast_prompt(self, question, context=None):
+        return FAST_PROMPT.format(question=question, context=context or "None")
 
-    def _standard_mode(self, question, stream=False):
-        tool_names = ", ".join(TOOLS.keys())
-        prompt = STANDARD_PROMPT.format(question=question, tools=tool_names)
-        return self.call_llm(prompt, stream)
+    def _standard_prompt(self, question, context=None):
+        return STANDARD_PROMPT.format(question=question, tools=self._tool_names(), context=context or "None")
 
-    def _deep_mode(self, question, stream=False):
-        tool_names = ", ".join(TOOLS.keys())
-        prompt = DEEP_PROMPT.format(question=question, tools=tool_names)
-        return self.call_llm(prompt, stream)
+    def _deep_prompt(self, question, context=None):
+        return DEEP_PROMPT.format(question=question, tools=self._tool_names(), context=context or "None")
 
 
 agent = AdaptiveAgent()
+get_tracer().register_gauges("llm", agent.stats)
+get_tracer().register_gauges("response_cache", agent.cache.stats)
@@ -0,0 +1,194 @@
+import os
+import re
+import hashlib
+
+# Large-repo limits, checked with stat() before anything is read
+MAX_FILE_BYTES = int(os.getenv("INGEST_MAX_FILE_BYTES", str(512 * 1024)))
+MAX_TOTAL_BYTES = int(os.getenv("INGEST_MAX_TOTAL_BYTES", str(200 * 1024 * 1024)))
+# Binary / generated detection only looks at the start of each file
+SNIFF_BYTES = 8192
+
+LOCKFILES = {
+    "package-lock.json", "yarn.lock", "pnpm-lock.yaml", "poetry.lock", "Pipfile.lock",
+    "Cargo.lock", "Gemfile.lock", "composer.lock", "go.sum", "packages.lock.json",
+}
+GENERATED_SUFFIXES = (".min.js", ".min.css", ".bundle.js", ".map", ".pb.go", "_pb2.py", ".g.dart", ".designer.cs")
+GENERATED_MARKERS = (b"@generated", b"DO NOT EDIT", b"Code generated", b"auto-generated", b"autogenerated")
+# A line this long in the first few KB means minified / machine-written output
+MAX_SNIFF_LINE = 1000
+
+class GitIgnore:
+    """
+    Minimal .gitignore matcher: globs, `**`, negation, directory-only
+    (trailing `/`) and anchored (leading or inner `/`) patterns.
+    """
+
+    def __init__(self, base, lines):
+        self.base = base  # Directory of the .gitignore, relative to the root ("" for root)
+        self.rules = []
+        for line in lines:
+            line = line.rstrip("\n").rstrip()
+            if not line or line.startswith("#"):
+                continue
+            negate = line.startswith("!")
+            if negate:
+                line = line[1:]
+            dir_only = line.endswith("/")
+            line = line.rstrip("/")
+            # A slash anywhere but the end anchors the pattern to this directory
+            anchored = "/" in line
+            self.rules.append((self._compile(line.lstrip("/")), negate, dir_only, anchored))
+
+    @staticmethod
+    def _compile(pattern):
+        regex = ""
+        i = 0
+        while i < len(pattern):
+            if pattern.startswith("**/", i):
+                regex += "(?:.*/)?"
+                i += 3
+            elif pattern.startswith("**", i):
+                regex += ".*"
+                i += 2
+            elif pattern[i] == "*":
+                regex += "[^/]*"
+                i += 1
+            elif pattern[i] == "?":
+                regex += "[^/]"
+                i += 1
+            elif pattern[i] == "[" and "]" in pattern[i + 1:]:
+                end = pattern.index("]", i + 1)
+                body = pattern[i + 1:end]
+                regex += "[" + ("^" + body[1:] if body.startswith("!") else body) + "]"
+                i = end + 1
+            else:
+                regex += re.escape(pattern[i])
+                i += 1
+        return re.compile(regex + r"\Z")
+
+    def match(self, rel_path, is_dir):
+        """Returns True/False if a rule decides the path, None if none applies."""
+        if self.base:
+            if not rel_path.startswith(self.base + "/"):
+                return None
+            rel_path = rel_path[len(self.base) + 1:]
+        name = rel_path.rsplit("/", 1)[-1]
+        result = None
+        for regex, negate, dir_only, anchored in self.rules:
+            if dir_only and not is_dir:
+                continue
+            if regex.match(rel_path if anchored else name):
+                result = not negate
+        return result
+
+def _is_ignored(rel_path, is_dir, ignores):
+    ignored = False
+    for ignore in ignores:
+        result = ignore.match(rel_path, is_dir)
+        if result is not None:
+            ignored = result
+    return ignored
+
+def walk_files(root):
+    """
+    Yields (relative_posix_path, size) for every file under `root` that isn't
+    hidden or excluded by a .gitignore (nested .gitignore files included).
+    Sizes come from stat(); no file content is read.
+    """
+    ignores = []
+    stack = [("", ignores)]
+    while stack:
+        rel_dir, inherited = stack.pop()
+        abs_dir = os.path.join(root, rel_dir)
+        active = inherited
+        gitignore = os.path.join(abs_dir, ".gitignore")
+        if os.path.isfile(gitignore):
+            with open(gitignore, encoding="utf-8", errors="ignore") as f:
+                active = inherited + [GitIgnore(rel_dir, f)]
+        try:
+            entries = sorted(os.scandir(abs_dir), key=lambda e: e.name)
+        except OSError:
+            continue
+        for entry in entries:
+            if entry.name.startswith("."):
+                continue
+            rel_path = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+            is_dir = entry.is_dir(follow_symlinks=False)
+            if _is_ignored(rel_path, is_dir, active):
+                continue
+            if is_dir:
+                stack.append((rel_path, active))
+            elif entry.is_file(follow_symlinks=False):
+                yield rel_path, entry.stat().st_size
+
+def sniff_file(abs_path):
+    """
+    Reads the first SNIFF_BYTES of a file and returns a skip reason
+    ('binary' / 'generated') or None if it looks like hand-written text.
+    """
+    with open(abs_path, "rb") as f:
+        head = f.read(SNIFF_BYTES)
+    if b"\0" in head:
+        return "binary"
+    # Control bytes other than common whitespace are rare in text of any encoding
+    control = sum(1 for byte in head if byte < 32 and byte not in (9, 10, 12, 13))
+    if head and control / len(head) > 0.1:
+        return "binary"
+    if any(marker in head for marker in GENERATED_MARKERS):
+        return "generated"
+    if any(len(line) > MAX_SNIFF_LINE for line in head.split(b"\n")[:-1 if len(head) == SNIFF_BYTES else None]):
+        return "generated"
+    return None
+
+def is_generated_name(rel_path):
+    name = rel_path.rsplit("/", 1)[-1]
+    return name in LOCKFILES or name.endswith(GENERATED_SUFFIXES)
+
+def select_files(root, candidates, max_file_bytes=MAX_FILE_BYTES, max_total_bytes=MAX_TOTAL_BYTES):
+    """
+    Filters {relative_path: size_or_None} down to files worth embedding.
+    Sizes missing from `candidates` are taken from stat(). Returns
+    (kept_paths, skipped) where skipped counts files per reason.
+    """
+    kept = []
+    skipped = {"too_large": 0, "binary": 0, "generated": 0, "over_budget": 0, "missing": 0}
+    total = 0
+    for rel_path in sorted(candidates):
+        if is_generated_name(rel_path):
+            skipped["generated"] += 1
+            continue
+        abs_path = os.path.join(root, rel_path)
+        size = candidates[rel_path]
+        if size is None:
+            try:
+                size = os.stat(abs_path).st_size
+            except OSError:
+                # Outside the sparse checkout, or deleted since listing
+                skipped["missing"] += 1
+                continue
+        if size > max_file_bytes:
+            skipped["too_large"] += 1
+            continue
+        if total + size > max_total_bytes:
+            skipped["over_budget"] += 1
+            continue
+        try:
+            reason = sniff_file(abs_path)
+        except OSError:
+            skipped["missing"] += 1
+            continue
+        if reason:
+            skipped[reason] += 1
+            continue
+        total += size
+        kept.append(rel_path)
+    return kept, skipped
+
+def git_blob_sha(abs_path):
+    """Same ID git would give the file, so local sources diff like cloned ones."""
+    size = os.stat(abs_path).st_size
+    sha = hashlib.sha1(f"blob {size}\0".encode())
+    with open(abs_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            sha.update(block)
+    return sha.hexdigest()
@@ -0,0 +1,208 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+import numpy as np
+
+CACHE_PATH = os.getenv("RESPONSE_CACHE_PATH", "./response_cache.sqlite")
+CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", str(24 * 3600)))
+CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "5000"))
+# Cosine similarity above which a different wording reuses a cached answer
+SEMANTIC_THRESHOLD = float(os.getenv("RESPONSE_CACHE_SEMANTIC_THRESHOLD", "0.95"))
+# Cached answers are replayed in pieces of this many characters
+REPLAY_CHUNK_CHARS = 24
+
+def normalize_question(question):
+    """Lowercases, collapses whitespace and drops trailing punctuation."""
+    return re.sub(r"\s+", " ", question.strip().lower()).rstrip("?!. ")
+
+def replay(text, chunk_chars=REPLAY_CHUNK_CHARS):
+    """Yields a cached answer in small pieces, like a live token stream."""
+    for i in range(0, len(text), chunk_chars):
+        yield text[i:i + chunk_chars]
+
+def _default_embed(text):
+    # The local embedding model is already loaded for retrieval; using it
+    # here keeps semantic lookups free and off the network
+    from db import get_embeddings_model
+    return get_embeddings_model().embed_query(text)
+
+class ResponseCache:
+    """
+    Two-tier LLM answer cache in SQLite.
+
+    Exact tier: keyed by sha256 of (normalized question, mode, collection,
+    model). Semantic tier: a question whose embedding is within
+    SEMANTIC_THRESHOLD of a cached question for the same collection, mode
+    and model reuses that answer. Entries expire after `ttl` seconds, the
+    least recently used are evicted past `max_entries`, and invalidate()
+    drops a collection's answers after it is re-ingested.
+    """
+
+    def __init__(self, path=CACHE_PATH, ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES,
+                 threshold=SEMANTIC_THRESHOLD, embed_fn=None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.embed_fn = embed_fn or _default_embed
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, collection TEXT NOT NULL, mode TEXT NOT NULL, model TEXT NOT NULL,"
+            " question TEXT NOT NULL, answer TEXT NOT NULL, sources TEXT, vector BLOB,"
+            " created_at REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_scope ON responses(collection, mode, model)")
+        self._conn.commit()
+        # In-process matrices for the semantic tier, per (collection, mode, model)
+        self._vectors = {}
+        self._data_version = None
+
+    def _key(self, question, mode, collection, model):
+        raw = f"{normalize_question(question)}\0{mode}\0{collection or ''}\0{model}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _check_external_writes(self):
+        # data_version changes when another connection (e.g. an ingest
+        # worker process invalidating a collection) commits
+        version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        if version != self._data_version:
+            self._vectors.clear()
+            self._data_version = version
+
+    def _scope_vectors(self, scope):
+        if scope not in self._vectors:
+            rows = self._conn.execute(
+                "SELECT key, vector FROM responses WHERE collection = ? AND mode = ? AND model = ?"
+                " AND vector IS NOT NULL AND created_at > ?",
+                scope + (time.time() - self.ttl,),
+            ).fetchall()
+            keys = [key for key, _ in rows]
+            matrix = np.array([np.frombuffer(blob, dtype=np.float32) for _, blob in rows], dtype=np.float32)
+            self._vectors[scope] = (keys, matrix)
+        return self._vectors[scope]
+
+    def embed(self, question):
+        """Normalized question embedding, reusable across get() calls (see `vector`)."""
+        vector = np.asarray(self.embed_fn(normalize_question(question)), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _fetch(self, key, now):
+        return self._conn.execute(
+            "SELECT answer, sources FROM responses WHERE key = ? AND created_at > ?", (key, now - self.ttl)
+        ).fetchone()
+
+    def get(self, question, mode, collection=None, model="mistral-tiny", semantic=True, vector=None):
+        """
+        Returns {"answer", "sources", "match"} or None. match is 'exact' or 'semantic'.
+        `vector` is the question's embed() if the caller already has it.
+        """
+        scope = (collection or "", mode, model)
+        key = self._key(question, mode, collection, model)
+        now = time.time()
+        with self._lock:
+            self._check_external_writes()
+            row = self._fetch(key, now)
+            match = "exact"
+            try_semantic = row is None and semantic and len(self._scope_vectors(scope)[0]) > 0
+        if try_semantic and vector is None:
+            # Model inference runs outside the lock, so other lookups and puts don't wait on it
+            vector = self.embed(question)
+        with self._lock:
+            if try_semantic:
+                keys, matrix = self._scope_vectors(scope)
+                if len(keys):
+                    scores = matrix @ vector
+                    best = int(np.argmax(scores))
+                    if scores[best] >= self.threshold:
+                        key = keys[best]
+                        row = self._fetch(key, now)
+                        match = "semantic"
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self._data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        if match == "exact":
+            self.exact_hits += 1
+        else:
+            self.semantic_hits += 1
+        return {"answer": row[0], "sources": json.loads(row[1]) if row[1] else None, "match": match}
+
+    def put(self, question, mode, answer, collection=None, model="mistral-tiny", sources=None):
+        if not answer:
+            return
+        scope = (collection or "", mode, model)
+        key = self._key(question, mode, collection, model)
+        vector = self.embed(question)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses"
+                " (key, collection, mode, model, question, answer, sources, vector, created_at, last_used)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, scope[0], mode, model, question, answer,
+                 json.dumps(sources) if sources is not None else None, vector.tobytes(), now, now),
+            )
+            self._evict(now)
+            self._conn.commit()
+            self._vectors.pop(scope, None)
+
+    def _evict(self, now):
+        self._conn.execute("DELETE FROM responses WHERE created_at <= ?", (now - self.ttl,))
+        count = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        if count > self.max_entries:
+            # Evict down to 90% so we don't pay for eviction on every insert
+            self._conn.execute(
+                "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY last_used ASC LIMIT ?)",
+                (count - int(self.max_entries * 0.9),),
+            )
+        self._vectors.clear()
+
+    def stream_through(self, tokens, question, mode, collection=None, model="mistral-tiny", sources=None):
+        """Passes a live token stream through and caches the answer once it completes."""
+        parts = []
+        for token in tokens:
+            parts.append(token)
+            yield token
+        self.put(question, mode, "".join(parts), collection, model, sources)
+
+    def invalidate(self, collection):
+        """Drops every cached answer for a collection (after a re-ingest)."""
+        with self._lock:
+            self._conn.execute("DELETE FROM responses WHERE collection = ?", (collection or "",))
+            self._conn.commit()
+            self._vectors.clear()
+
+    def stats(self):
+        lookups = self.exact_hits + self.semantic_hits + self.misses
+        return {
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": (self.exact_hits + self.semantic_hits) / lookups if lookups else 0.0,
+        }
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_cache():
+    """Process-wide response cache."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResponseCache()
+    return _cache
+
+def invalidate(collection):
+    get_cache().invalidate(collection)
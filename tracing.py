@@ -0,0 +1,218 @@
+import os
+import json
+import time
+import uuid
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+TRACE_BUFFER_SIZE = int(os.getenv("TRACE_BUFFER_SIZE", "5000"))
+# Optional exports: every span appended to a JSONL file, and/or a
+# Prometheus text endpoint at http://<host>:<port>/metrics
+TRACE_JSONL_PATH = os.getenv("TRACE_JSONL_PATH") or None
+TRACE_PROMETHEUS_PORT = int(os.getenv("TRACE_PROMETHEUS_PORT", "0")) or None
+# Request stages, in pipeline order (the debug panel lists them like this)
+STAGES = ("latency_probe", "retrieval", "embedding", "prompt_build", "ttft", "generation", "tts", "chat_persistence")
+
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+
+class Trace:
+    """The spans of one request, e.g. one chat turn."""
+
+    def __init__(self, name):
+        self.id = uuid.uuid4().hex[:16]
+        self.name = name
+        self.started = time.perf_counter()
+        self.started_at = time.time()
+        self.ended = None
+        self.spans = []
+
+    def duration_ms(self, name):
+        """Summed duration of the spans called `name`, or None if there were none."""
+        durations = [span["duration_ms"] for span in self.spans if span["name"] == name]
+        return sum(durations) if durations else None
+
+    def first_token_ms(self):
+        """Time from the start of the request to the first answer token, or None."""
+        for span in self.spans:
+            if span["name"] == "ttft":
+                return (span["start"] - self.started_at) * 1000 + span["duration_ms"]
+        return None
+
+    def total_ms(self):
+        return ((self.ended or time.perf_counter()) - self.started) * 1000
+
+def _percentile(sorted_values, q):
+    return sorted_values[min(len(sorted_values) - 1, int(q / 100 * len(sorted_values)))]
+
+class Tracer:
+    """
+    Lightweight span recorder. Spans are dicts (trace_id, name, start,
+    duration_ms plus attributes) kept in a ring buffer of `size`, optionally
+    appended to a JSONL file. A span belongs to the trace active in its
+    context (see trace()); spans outside any trace, like background
+    latency probes, still count towards per-stage statistics.
+    """
+
+    def __init__(self, size=TRACE_BUFFER_SIZE, jsonl_path=TRACE_JSONL_PATH):
+        self.spans = deque(maxlen=size)
+        self.jsonl_path = jsonl_path
+        self._jsonl = None
+        self._gauges = {}
+        self._lock = threading.Lock()
+
+    def record(self, name, duration_s, **attrs):
+        """Records a span that was timed elsewhere."""
+        trace = _current_trace.get()
+        span = {"trace_id": trace.id if trace else None, "name": name, "start": time.time() - duration_s,
+                "duration_ms": duration_s * 1000, **attrs}
+        with self._lock:
+            self.spans.append(span)
+            if self.jsonl_path:
+                if self._jsonl is None:
+                    self._jsonl = open(self.jsonl_path, "a", encoding="utf-8", buffering=1)
+                self._jsonl.write(json.dumps(span, default=str) + "\n")
+        if trace is not None:
+            trace.spans.append(span)
+        return span
+
+    @contextmanager
+    def span(self, name, **attrs):
+        """Times the block. Yields the attribute dict, so the block can add to it."""
+        start = time.perf_counter()
+        try:
+            yield attrs
+        finally:
+            self.record(name, time.perf_counter() - start, **attrs)
+
+    @contextmanager
+    def trace(self, name):
+        """Groups the spans recorded in this context (thread / task) into one Trace."""
+        trace = Trace(name)
+        token = _current_trace.set(trace)
+        try:
+            yield trace
+        finally:
+            trace.ended = time.perf_counter()
+            self.record(name, trace.ended - trace.started)
+            _current_trace.reset(token)
+
+    def stage_stats(self):
+        """{name: {"count", "p50_ms", "p95_ms", "mean_ms"}} over the ring buffer."""
+        with self._lock:
+            spans = list(self.spans)
+        durations = {}
+        for span in spans:
+            durations.setdefault(span["name"], []).append(span["duration_ms"])
+        stats = {}
+        for name, values in durations.items():
+            values.sort()
+            stats[name] = {
+                "count": len(values),
+                "p50_ms": _percentile(values, 50),
+                "p95_ms": _percentile(values, 95),
+                "mean_ms": sum(values) / len(values),
+            }
+        return stats
+
+    def register_gauges(self, prefix, fn):
+        """Adds numeric values returned by `fn()` (a flat dict) to the Prometheus output."""
+        self._gauges[prefix] = fn
+
+    def prometheus_text(self):
+        lines = [
+            "# HELP stage_duration_ms Duration of request stages over the recent span buffer.",
+            "# TYPE stage_duration_ms summary",
+        ]
+        for name, stats in sorted(self.stage_stats().items()):
+            lines.append(f'stage_duration_ms{{stage="{name}",quantile="0.5"}} {stats["p50_ms"]:.3f}')
+            lines.append(f'stage_duration_ms{{stage="{name}",quantile="0.95"}} {stats["p95_ms"]:.3f}')
+            lines.append(f'stage_duration_ms_sum{{stage="{name}"}} {stats["mean_ms"] * stats["count"]:.3f}')
+            lines.append(f'stage_duration_ms_count{{stage="{name}"}} {stats["count"]}')
+        for prefix, fn in self._gauges.items():
+            try:
+                values = fn()
+            except Exception as e:
+                print(f"Gauge {prefix} failed: {e}")
+                continue
+            for key, value in values.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    lines.append(f"# TYPE {prefix}_{key} gauge")
+                    lines.append(f"{prefix}_{key} {value}")
+        return "\n".join(lines) + "\n"
+
+    def serve_prometheus(self, port):
+        """Serves prometheus_text() at /metrics on a daemon thread."""
+        tracer = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                if self.path.rstrip("/") != "/metrics":
+                    self.send_error(404)
+                    return
+                body = tracer.prometheus_text().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        server = ThreadingHTTPServer(("0.0.0.0", port), MetricsHandler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True, name="metrics").start()
+        print(f"Prometheus metrics on http://0.0.0.0:{port}/metrics")
+        return server
+
+_tracer = None
+_tracer_lock = threading.Lock()
+
+def get_tracer():
+    """Process-wide tracer; starts the metrics endpoint if TRACE_PROMETHEUS_PORT is set."""
+    global _tracer
+    with _tracer_lock:
+        if _tracer is None:
+            _tracer = Tracer()
+            if TRACE_PROMETHEUS_PORT:
+                try:
+                    _tracer.serve_prometheus(TRACE_PROMETHEUS_PORT)
+                except OSError as e:
+                    print(f"Could not serve metrics on port {TRACE_PROMETHEUS_PORT}: {e}")
+    return _tracer
+
+def span(name, **attrs):
+    return get_tracer().span(name, **attrs)
+
+def record(name, duration_s, **attrs):
+    return get_tracer().record(name, duration_s, **attrs)
+
+def trace(name):
+    return get_tracer().trace(name)
+
+def trace_tokens(tokens):
+    """Passes a token stream through, recording ttft and generation (with tokens/s) spans."""
+    start = time.perf_counter()
+    count = 0
+    for token in tokens:
+        if count == 0:
+            record("ttft", time.perf_counter() - start)
+        count += 1
+        yield token
+    elapsed = time.perf_counter() - start
+    record("generation", elapsed, tokens=count, tokens_per_s=count / elapsed if elapsed else 0.0)
+
+async def atrace_tokens(tokens):
+    """Async trace_tokens()."""
+    start = time.perf_counter()
+    count = 0
+    async for token in tokens:
+        if count == 0:
+            record("ttft", time.perf_counter() - start)
+        count += 1
+        yield token
+    elapsed = time.perf_counter() - start
+    record("generation", elapsed, tokens=count, tokens_per_s=count / elapsed if elapsed else 0.0)
@@ -0,0 +1,146 @@
+import os
+import re
+import time
+import queue
+import asyncio
+import threading
+from prompt_templates import FAST_PROMPT, TOT_BRANCH_PROMPT, TOT_CRITIQUE_PROMPT, TOT_ANSWER_PROMPT
+
+# DEEP mode: approaches brainstormed in parallel (0 or 1 keeps the single DEEP_PROMPT completion)
+TOT_BRANCHES = int(os.getenv("TOT_BRANCHES", "3"))
+# Token cap per brainstormed approach
+TOT_BRANCH_TOKENS = int(os.getenv("TOT_BRANCH_TOKENS", "256"))
+TOT_CRITIQUE_TOKENS = 96
+# Seconds for brainstorm + critique; after that the best branch so far is used
+TOT_DEADLINE = float(os.getenv("TOT_DEADLINE", "15"))
+
+SCORE_PATTERN = re.compile(r"SCORE:\s*(\d+(?:\.\d+)?)", re.IGNORECASE)
+
+_DONE = object()
+
+def parse_score(critique):
+    match = SCORE_PATTERN.search(critique or "")
+    return float(match.group(1)) if match else 0.0
+
+class TreeOfThought:
+    """
+    Tree-of-Thought executor for DEEP mode.
+
+    Brainstorms `branches` approaches as concurrent LLM calls, critiques
+    them in parallel, then streams an answer from the best-scored branch
+    only. Brainstorm and critique share one `deadline`: when it passes,
+    unfinished calls are cancelled and the best branch so far is used
+    (a direct answer if no branch finished at all).
+    """
+
+    def __init__(self, llm, branches=TOT_BRANCHES, branch_tokens=TOT_BRANCH_TOKENS, deadline=TOT_DEADLINE):
+        self.llm = llm
+        self.branches = branches
+        self.branch_tokens = branch_tokens
+        self.deadline = deadline
+
+    async def _gather_until(self, coros, deadline):
+        """Runs coros concurrently; returns {index: result} of those done by `deadline` (perf_counter)."""
+        tasks = {asyncio.ensure_future(coro): i for i, coro in enumerate(coros)}
+        done, pending = await asyncio.wait(tasks, timeout=max(0, deadline - time.perf_counter()))
+        for task in pending:
+            task.cancel()
+        results = {}
+        for task in done:
+            if task.exception() is None:
+                results[tasks[task]] = task.result()
+            else:
+                print(f"Tree of Thought call failed: {task.exception()!r}")
+        return results
+
+    async def select(self, question, context=None, tools="", user=None, timings=None):
+        """Brainstorm and critique phases. Returns the chosen approach, or None."""
+        timings = {} if timings is None else timings
+        start = time.perf_counter()
+        deadline = start + self.deadline
+        branches = await self._gather_until([
+            self.llm.acomplete(TOT_BRANCH_PROMPT.format(branches=self.branches, index=i + 1, question=question,
+                                                        tools=tools, context=context or "None"),
+                               user=user, max_tokens=self.branch_tokens)
+            for i in range(self.branches)
+        ], deadline)
+        timings["brainstorm"] = time.perf_counter() - start
+        if not branches:
+            timings["fallback"] = "no branch"
+            return None
+        # Completed branches in index order, so ties go to the first
+        approaches = [branches[i] for i in sorted(branches)]
+        if len(approaches) == 1:
+            return approaches[0]
+
+        critique_start = time.perf_counter()
+        critiques = await self._gather_until([
+            self.llm.acomplete(TOT_CRITIQUE_PROMPT.format(question=question, approach=approach),
+                               user=user, max_tokens=TOT_CRITIQUE_TOKENS)
+            for approach in approaches
+        ], deadline)
+        timings["critique"] = time.perf_counter() - critique_start
+        if len(critiques) < len(approaches):
+            timings["fallback"] = f"deadline ({len(critiques)}/{len(approaches)} critiques)"
+        scores = [parse_score(critiques.get(i)) for i in range(len(approaches))]
+        timings["scores"] = scores
+        return approaches[max(range(len(approaches)), key=lambda i: scores[i])]
+
+    async def astream(self, question, context=None, tools="", user=None, timings=None, budget=None):
+        """
+        Async generator of final answer tokens; `budget` bounds the answer's
+        first token (see LLMClient.astream). If `timings` is a dict, phase
+        timings (seconds) are added to it: brainstorm, critique,
+        first_token, answer and total.
+        """
+        timings = {} if timings is None else timings
+        start = time.perf_counter()
+        approach = await self.select(question, context, tools, user, timings)
+        if approach is None:
+            prompt = FAST_PROMPT.format(question=question, context=context or "None")
+        else:
+            prompt = TOT_ANSWER_PROMPT.format(approach=approach, question=question, context=context or "None")
+        answer_start = time.perf_counter()
+        async for token in self.llm.astream(prompt, user=user, timeout=budget):
+            if "first_token" not in timings:
+                timings["first_token"] = time.perf_counter() - answer_start
+            yield token
+        timings["answer"] = time.perf_counter() - answer_start
+        timings["total"] = time.perf_counter() - start
+        print("Tree of Thought: " + ", ".join(
+            f"{phase} {value * 1000:.0f}ms" if isinstance(value, float) else f"{phase} {value}"
+            for phase, value in timings.items()))
+
+    def stream(self, question, context=None, tools="", user=None, timings=None, budget=None):
+        """Sync generator over astream(), which runs on its own event loop thread."""
+        tokens = queue.Queue()
+        loop = asyncio.new_event_loop()
+
+        async def pump():
+            try:
+                async for token in self.astream(question, context, tools, user, timings, budget):
+                    tokens.put(token)
+            except Exception as e:
+                tokens.put(e)
+            finally:
+                tokens.put(_DONE)
+
+        task = loop.create_task(pump())
+
+        def run():
+            try:
+                loop.run_until_complete(task)
+            except asyncio.CancelledError:
+                pass  # The consumer stopped reading
+
+        thread = threading.Thread(target=run, daemon=True, name="tree-of-thought")
+        thread.start()
+        try:
+            while (item := tokens.get()) is not _DONE:
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            loop.call_soon_threadsafe(task.cancel)
+            thread.join()
+            loop.close()